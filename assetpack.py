@@ -0,0 +1,166 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+import os, json, mmap, struct
+
+import pygame
+
+MAGIC = 'YASSPACK1\n'
+
+def get_stamp(path):
+    # a pack entry is stale once its source file changes
+    st = os.stat(path)
+    return [st.st_size, int(st.st_mtime)]
+
+class AssetPack:
+    """display format pixels and decoded samples of the game's assets, in one file.
+
+    The first launch writes the pack. Later launches memory-map it and copy
+    the stored bytes straight into new surfaces and sounds instead of
+    decoding the PNG, WAV and OGG files again. key describes the display
+    format, a pack written for a different one is ignored. Sounds are only
+    used while the mixer runs with the format they were stored in.
+    """
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self.entries = {}
+        self.added = {}
+        self.file = None
+        self.data = None
+        self.data_start = 0
+        self.hits = 0
+        self.misses = 0
+        self.open()
+
+    def open(self):
+        try:
+            f = open(self.path, 'rb')
+        except IOError:
+            return
+        try:
+            if f.read(len(MAGIC)) != MAGIC:
+                f.close()
+                return
+            (length,) = struct.unpack('<I', f.read(4))
+            index = json.loads(f.read(length))
+            if index['key'] != self.key:
+                f.close()
+                return
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, KeyError, struct.error, EnvironmentError):
+            f.close()
+            return
+        self.file = f
+        self.entries = index['entries']
+        self.data_start = len(MAGIC) + 4 + length
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def read(self, entry):
+        start = self.data_start + entry['offset']
+        return self.data[start:start + entry['length']]
+
+    def lookup(self, name, path, kind):
+        entry = self.entries.get(name)
+        if entry is None or entry['kind'] != kind or entry['stamp'] != get_stamp(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def get_image(self, name, path):
+        entry = self.lookup(name, path, 'image')
+        if entry is None:
+            return None
+        surface = pygame.Surface(entry['size'], entry['flags'], entry['bitsize'], entry['masks'])
+        if surface.get_pitch() != entry['pitch']:
+            return None
+        surface.get_buffer().write(self.read(entry), 0)
+        return surface
+
+    def add_image(self, name, path, surface):
+        entry = {
+            'kind': 'image',
+            'stamp': get_stamp(path),
+            'size': list(surface.get_size()),
+            'flags': surface.get_flags() & pygame.SRCALPHA,
+            'bitsize': surface.get_bitsize(),
+            'masks': list(surface.get_masks()),
+            'pitch': surface.get_pitch(),
+        }
+        self.added[name] = (entry, surface.get_buffer().raw)
+
+    def get_sound(self, name, path):
+        entry = self.lookup(name, path, 'sound')
+        if entry is None or entry['format'] != list(pygame.mixer.get_init()):
+            return None
+        return pygame.mixer.Sound(buffer=self.read(entry))
+
+    def add_sound(self, name, path, sound):
+        entry = {'kind': 'sound', 'stamp': get_stamp(path), 'format': list(pygame.mixer.get_init())}
+        self.added[name] = (entry, sound.get_raw())
+
+    def save(self):
+        if not self.added:
+            return
+
+        entries = {}
+        blobs = []
+        offset = 0
+        for name, entry in self.entries.items():
+            if name not in self.added:
+                self.added[name] = (entry, self.read(entry))
+        for name, (entry, data) in self.added.items():
+            entry = dict(entry)
+            entry['offset'] = offset
+            entry['length'] = len(data)
+            entries[name] = entry
+            blobs.append(data)
+            offset += len(data)
+        self.added = {}
+
+        # the old pack has to be closed before it can be replaced
+        self.close()
+        index = json.dumps({'key': self.key, 'entries': entries})
+        temp_path = self.path + '.tmp'
+        try:
+            f = open(temp_path, 'wb')
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(index)))
+            f.write(index)
+            for data in blobs:
+                f.write(data)
+            f.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(temp_path, self.path)
+        except EnvironmentError, message:
+            print 'Cannot write asset pack:', message
+        self.open()
+
+    def report(self):
+        return "%d entries, %d hits, %d misses" % (len(self.entries), self.hits, self.misses)
@@ -0,0 +1,112 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+from timeit import default_timer as timer
+
+import pygame
+
+from profiler import percentile
+
+class VoiceManager:
+    """plays sounds on mixer channels set aside for each category of sound.
+
+    budgets is a list of (category, channels). When a category's channels
+    are all busy the lowest priority voice, the oldest among equals, is
+    stopped for the new sound if that is of the same or higher priority,
+    otherwise the new sound is dropped. A sound already started this frame
+    isn't started again. Nothing plays until start() is called with the
+    mixer running.
+
+    SDL doesn't tell Python when a sound reaches the speakers, so latency
+    is reported as the length of the mixer's buffer, which a new sound
+    waits behind, along with how long play() itself takes.
+    """
+
+    def __init__(self, budgets):
+        self.budgets = budgets
+        self.channels = {}
+        # channel id -> (priority, when it started)
+        self.voices = {}
+        self.frame_sounds = set()
+        self.counts = dict([(category, {'played': 0, 'stolen': 0, 'dropped': 0, 'limited': 0}) for category, channels in budgets])
+        self.play_times = []
+        self.latency = 0.0
+
+    def start(self, buffer_size):
+        if not pygame.mixer.get_init():
+            return
+        total = sum([channels for category, channels in self.budgets])
+        pygame.mixer.set_num_channels(total)
+        pygame.mixer.set_reserved(total)
+        first = 0
+        for category, channels in self.budgets:
+            self.channels[category] = [pygame.mixer.Channel(i) for i in range(first, first + channels)]
+            first += channels
+
+        # the frequency asked for in pre_init() isn't always the one we get
+        frequency = pygame.mixer.get_init()[0]
+        self.latency = float(buffer_size) / frequency
+
+    def play(self, sound, category, priority = 0):
+        channels = self.channels.get(category)
+        if not channels:
+            return None
+        counts = self.counts[category]
+        if sound in self.frame_sounds:
+            counts['limited'] += 1
+            return None
+
+        start = timer()
+        channel = None
+        for candidate in channels:
+            if not candidate.get_busy():
+                channel = candidate
+                break
+        if channel is None:
+            # steal the least important voice, the oldest if there is a tie
+            victim = min(channels, key=lambda c: self.voices.get(id(c), (0, 0)))
+            if self.voices.get(id(victim), (0, 0))[0] > priority:
+                counts['dropped'] += 1
+                return None
+            victim.stop()
+            counts['stolen'] += 1
+            channel = victim
+
+        channel.play(sound)
+        self.voices[id(channel)] = (priority, start)
+        self.frame_sounds.add(sound)
+        counts['played'] += 1
+        self.play_times.append(timer() - start)
+        if len(self.play_times) > 1000:
+            del self.play_times[:500]
+        return channel
+
+    def end_frame(self):
+        self.frame_sounds.clear()
+
+    def report(self):
+        if not self.channels:
+            return "no mixer"
+        parts = []
+        for category, channels in self.budgets:
+            counts = self.counts[category]
+            parts.append("%s %d played %d stolen %d dropped %d limited" % (category, counts['played'], counts['stolen'], counts['dropped'], counts['limited']))
+        times = list(self.play_times) or [0.0]
+        return "%s; %.1f ms buffer, play() p50 %.3f ms, longest %.3f ms" % (", ".join(parts), self.latency * 1000,
+            percentile(times, 0.5) * 1000, max(times) * 1000)
@@ -0,0 +1,395 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+# Many independent games stepped together, for bots and soak tests.
+#
+# The rules follow main.py's step() but every quantity is an array with one
+# row per game, so K games cost a handful of NumPy operations per tick.
+# Nothing here needs a display. Where it knowingly differs from step():
+#
+#   - collisions are circle tests only, there are no pixel masks
+#     (g.mask_collisions)
+#   - rocks don't spin, and rock spawns use their own random numbers
+#   - there is only the normal game, no stress mode and no two player game
+#   - fire is one shot per tick rather than one per key press
+#
+# tests/test_batchenv.py plays the same rocks and input through both and
+# checks they stay together.
+#
+#   python batchenv.py --games 256 --workers 4 --ticks 2000
+
+import time, argparse
+import multiprocessing
+
+import numpy
+
+import main
+
+# columns of the action array
+TURN, THRUST, FIRE = 0, 1, 2
+# ship values at the start of each observation
+SHIP_OBSERVATION = 8
+# values for each rock slot: position relative to the ship, velocity, alive
+ROCK_OBSERVATION = 5
+
+class BatchEnv:
+    """count games of YASS stepped in lock step.
+
+    step() takes an int array of shape (count, 3): turn (-1 right, 0, 1 left),
+    thrust (0 or 1) and fire (0 or 1, one shot per tick). It returns
+    observations, rewards and done flags as arrays with one row per game.
+    The reward is the drop in wave_rocks_left this tick, less death_penalty
+    when the ship is destroyed. A finished game is reset straight away
+    when auto_reset is set, its done flag still reports the death.
+    """
+
+    def __init__(self, count, seed = None, max_rocks = 64, max_missiles = 128, death_penalty = 10.0, auto_reset = True):
+        g = main.Globals()
+        self.count = count
+        self.width = g.width
+        self.height = g.height
+        self.ticks_per_second = g.ticks_per_second
+        self.turn_speed = g.ship_turn_speed
+        self.friction = g.friction
+        self.missile_speed = g.missile_initial_vel
+        self.ship_radius = main.ship_info.get_radius()
+        self.ship_size = main.ship_info.get_size()
+        self.rock_radius = main.asteroid_info.get_radius()
+        self.missile_radius = main.missile_info.get_radius()
+        self.missile_lifespan = main.missile_info.get_lifespan()
+        self.max_rocks = max_rocks
+        self.max_missiles = max_missiles
+        self.death_penalty = death_penalty
+        self.auto_reset = auto_reset
+        self.random = numpy.random.RandomState(seed)
+
+        self.observation_size = SHIP_OBSERVATION + ROCK_OBSERVATION * max_rocks
+
+        self.time = numpy.zeros(count, dtype=int)
+        self.wave = numpy.zeros(count, dtype=int)
+        self.wave_rocks_left = numpy.zeros(count, dtype=int)
+        self.lives = numpy.zeros(count, dtype=int)
+        self.playing = numpy.zeros(count, dtype=bool)
+        self.betweenwaves = numpy.zeros(count, dtype=bool)
+        self.wave_delay_start = numpy.zeros(count, dtype=int)
+
+        self.ship_pos = numpy.zeros((count, 2))
+        self.ship_vel = numpy.zeros((count, 2))
+        self.ship_angle = numpy.zeros(count)
+
+        self.rock_pos = numpy.zeros((count, max_rocks, 2))
+        self.rock_vel = numpy.zeros((count, max_rocks, 2))
+        self.rock_alive = numpy.zeros((count, max_rocks), dtype=bool)
+
+        self.missile_pos = numpy.zeros((count, max_missiles, 2))
+        self.missile_vel = numpy.zeros((count, max_missiles, 2))
+        self.missile_age = numpy.zeros((count, max_missiles), dtype=int)
+        self.missile_alive = numpy.zeros((count, max_missiles), dtype=bool)
+
+        self.reset()
+
+    def reset(self, mask = None):
+        """start new games, all of them or those where mask is set."""
+        if mask is None:
+            mask = numpy.ones(self.count, dtype=bool)
+        self.time[mask] = 0
+        self.lives[mask] = 1
+        self.wave[mask] = 0
+        self.playing[mask] = True
+        self.betweenwaves[mask] = False
+        self.wave_delay_start[mask] = 0
+
+        # new_game() puts the ship's top left corner in the middle of the screen
+        self.ship_pos[mask] = [self.width / 2 - self.ship_size[0] / 2, self.height / 2 - self.ship_size[1] / 2]
+        self.ship_vel[mask] = 0
+        self.ship_angle[mask] = 90
+
+        self.new_wave(mask)
+        return self.get_observations()
+
+    def new_wave(self, mask):
+        self.wave[mask] += 1
+        self.wave_rocks_left[mask] = 5 * self.wave[mask]
+        self.rock_alive[mask] = False
+        self.missile_alive[mask] = False
+
+    def step(self, actions):
+        actions = numpy.asarray(actions)
+        self.time += 1
+        playing = self.playing.copy()
+
+        self.shoot(playing & (actions[:, FIRE] != 0))
+        self.spawn_rocks(playing)
+
+        # update_sprites()
+        self.missile_pos += self.missile_vel
+        self.missile_pos %= (self.width, self.height)
+        self.missile_age += 1
+        self.rock_pos += self.rock_vel
+        self.rock_pos %= (self.width, self.height)
+        self.update_ships(playing, actions)
+        self.missile_alive &= self.missile_age <= self.missile_lifespan
+
+        # handle_collisions()
+        died = self.collide_ships(playing)
+        hits = self.collide_missiles(playing & ~died)
+        self.wave_rocks_left -= hits
+        self.betweenwaves |= playing & ~died & (self.wave_rocks_left <= 0)
+
+        rewards = hits - self.death_penalty * died
+        info = {'wave': self.wave.copy(), 'time': self.time.copy()}
+        if self.auto_reset and died.any():
+            self.reset(died)
+        return self.get_observations(), rewards, died, info
+
+    def shoot(self, firing):
+        free = ~self.missile_alive.all(1)
+        games = numpy.flatnonzero(firing & free)
+        if not len(games):
+            return
+        slots = numpy.argmin(self.missile_alive[games], axis=1)
+        radians = numpy.radians(self.ship_angle[games])
+        # flip the Y as Y is down on screen
+        direction = numpy.column_stack((numpy.cos(radians), -numpy.sin(radians)))
+        self.missile_pos[games, slots] = self.ship_pos[games] + direction * self.ship_radius
+        self.missile_vel[games, slots] = self.ship_vel[games] + direction * self.missile_speed
+        self.missile_age[games, slots] = 0
+        self.missile_alive[games, slots] = True
+
+    def spawn_rocks(self, playing):
+        due = playing & (self.time % self.ticks_per_second == 0)
+
+        # the one second pause between waves
+        waiting = due & self.betweenwaves
+        starting = waiting & (self.wave_delay_start == 0)
+        self.wave_delay_start[starting] = self.time[starting]
+        paused = waiting & ~starting & (self.time - self.wave_delay_start < self.ticks_per_second)
+        finished = waiting & ~starting & ~paused
+        self.new_wave(finished)
+        self.betweenwaves[finished] = False
+        self.wave_delay_start[finished] = 0
+
+        due &= ~(starting | paused)
+        due &= self.rock_alive.sum(1) < self.wave_rocks_left
+        due &= ~self.rock_alive.all(1)
+        games = numpy.flatnonzero(due)
+        n = len(games)
+        if not n:
+            return
+
+        # spawn on an edge, away from the ship; redraw the ones that landed too close
+        pos = numpy.zeros((n, 2))
+        todo = numpy.arange(n)
+        min_dist_sq = (self.ship_radius * 4) ** 2
+        while len(todo):
+            k = len(todo)
+            vertical = self.random.randint(0, 2, k) == 0
+            edge = self.random.randint(0, 2, k)
+            along_x = self.random.uniform(0, self.width, k)
+            along_y = self.random.uniform(0, self.height, k)
+            pos[todo, 0] = numpy.where(vertical, edge * self.width, along_x)
+            pos[todo, 1] = numpy.where(vertical, along_y, edge * self.height)
+            d = pos[todo] - self.ship_pos[games[todo]]
+            todo = todo[(d ** 2).sum(1) < min_dist_sq]
+
+        # even waves aim at the ship, odd ones scatter; speed grows with the wave
+        wave = self.wave[games][:, None]
+        toward = (self.ship_pos[games] - pos) / (self.width, self.height) * self.random.uniform(0, 1, (n, 2)) * wave
+        scatter = self.random.uniform(-1, 1, (n, 2)) * wave
+        vel = numpy.where(wave % 2 == 0, toward, scatter)
+
+        slots = numpy.argmin(self.rock_alive[games], axis=1)
+        self.rock_pos[games, slots] = pos
+        self.rock_vel[games, slots] = vel
+        self.rock_alive[games, slots] = True
+
+    def update_ships(self, playing, actions):
+        self.ship_angle += numpy.where(playing, actions[:, TURN] * self.turn_speed, 0)
+        radians = numpy.radians(self.ship_angle)
+        thrust = playing & (actions[:, THRUST] != 0)
+        self.ship_vel[:, 0] += numpy.where(thrust, numpy.cos(radians) / 3, 0)
+        self.ship_vel[:, 1] -= numpy.where(thrust, numpy.sin(radians) / 3, 0)
+        self.ship_vel[playing] *= self.friction
+        self.ship_pos[playing] += self.ship_vel[playing]
+        self.ship_pos %= (self.width + self.ship_radius, self.height + self.ship_radius)
+
+    def collide_ships(self, playing):
+        d = self.rock_pos - self.ship_pos[:, None, :]
+        hit = self.rock_alive & ((d ** 2).sum(2) < (self.rock_radius + self.ship_radius) ** 2)
+        hit &= playing[:, None]
+        self.rock_alive &= ~hit
+        struck = hit.any(1)
+        self.lives -= struck
+        died = struck & (self.lives <= 0)
+        self.playing &= ~died
+        return died
+
+    def collide_missiles(self, playing):
+        # slots are filled from the front, so only test up to the last one in use
+        rocks = used_slots(self.rock_alive)
+        missiles = used_slots(self.missile_alive)
+        hits = numpy.zeros(self.count, dtype=int)
+        if not rocks or not missiles:
+            return hits
+        d = self.rock_pos[:, :rocks, None, :] - self.missile_pos[:, None, :missiles, :]
+        hit = (d ** 2).sum(3) < (self.rock_radius + self.missile_radius) ** 2
+        hit &= self.rock_alive[:, :rocks, None] & self.missile_alive[:, None, :missiles] & playing[:, None, None]
+
+        # group_group_collide() goes through the rocks in order and a missile
+        # is used up by the first rock it hits
+        missile_hit = hit.any(1)
+        first_rock = numpy.argmax(hit, axis=1)
+        games, slots = numpy.nonzero(missile_hit)
+        self.rock_alive[games, first_rock[games, slots]] = False
+        self.missile_alive[:, :missiles] &= ~missile_hit
+        return missile_hit.sum(1)
+
+    def get_observations(self):
+        obs = numpy.zeros((self.count, self.observation_size), dtype=numpy.float32)
+        radians = numpy.radians(self.ship_angle)
+        obs[:, 0:2] = self.ship_pos
+        obs[:, 2:4] = self.ship_vel
+        obs[:, 4] = numpy.cos(radians)
+        obs[:, 5] = numpy.sin(radians)
+        obs[:, 6] = self.wave
+        obs[:, 7] = self.wave_rocks_left
+        rocks = obs[:, SHIP_OBSERVATION:].reshape(self.count, self.max_rocks, ROCK_OBSERVATION)
+        rocks[:, :, 0:2] = self.rock_pos - self.ship_pos[:, None, :]
+        rocks[:, :, 2:4] = self.rock_vel
+        rocks[:, :, 4] = self.rock_alive
+        rocks[~self.rock_alive] = 0
+        return obs
+
+def used_slots(alive):
+    # one past the highest slot alive in any game
+    used = numpy.flatnonzero(alive.any(0))
+    if not len(used):
+        return 0
+    return used[-1] + 1
+
+def worker(conn, count, seed, options):
+    env = BatchEnv(count, seed, **options)
+    while 1:
+        command, data = conn.recv()
+        if command == 'step':
+            conn.send(env.step(data))
+        elif command == 'reset':
+            conn.send(env.reset(data))
+        elif command == 'close':
+            conn.close()
+            return
+
+class ProcessBatchEnv:
+    """a BatchEnv split into shards, one per worker process.
+
+    Takes and returns the same arrays as BatchEnv, with the shards joined
+    back together in order.
+    """
+
+    def __init__(self, count, workers = None, seed = None, **options):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        workers = max(1, min(workers, count))
+        self.count = count
+        sizes = [count // workers + (i < count % workers) for i in range(workers)]
+        self.bounds = numpy.cumsum([0] + sizes)
+
+        self.connections = []
+        self.processes = []
+        for i, size in enumerate(sizes):
+            parent, child = multiprocessing.Pipe()
+            shard_seed = None
+            if seed is not None:
+                shard_seed = seed + i
+            process = multiprocessing.Process(target=worker, args=(child, size, shard_seed, options))
+            process.daemon = True
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def shards(self, array):
+        return [array[self.bounds[i]:self.bounds[i + 1]] for i in range(len(self.connections))]
+
+    def reset(self, mask = None):
+        if mask is None:
+            masks = [None] * len(self.connections)
+        else:
+            masks = self.shards(numpy.asarray(mask))
+        for conn, shard in zip(self.connections, masks):
+            conn.send(('reset', shard))
+        return numpy.concatenate([conn.recv() for conn in self.connections])
+
+    def step(self, actions):
+        for conn, shard in zip(self.connections, self.shards(numpy.asarray(actions))):
+            conn.send(('step', shard))
+        results = [conn.recv() for conn in self.connections]
+        observations = numpy.concatenate([r[0] for r in results])
+        rewards = numpy.concatenate([r[1] for r in results])
+        dones = numpy.concatenate([r[2] for r in results])
+        info = {}
+        for key in results[0][3]:
+            info[key] = numpy.concatenate([r[3][key] for r in results])
+        return observations, rewards, dones, info
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(('close', None))
+            conn.close()
+        for process in self.processes:
+            process.join()
+
+def random_actions(random, count):
+    actions = numpy.zeros((count, 3), dtype=int)
+    actions[:, TURN] = random.randint(-1, 2, count)
+    actions[:, THRUST] = random.randint(0, 2, count)
+    actions[:, FIRE] = random.randint(0, 4, count) == 0
+    return actions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Step many games of Yet Another Space Shooter with random actions')
+    parser.add_argument('--games', type=int, default=64, help='number of games')
+    parser.add_argument('--workers', type=int, default=0, help='worker processes, 0 runs every game in this process')
+    parser.add_argument('--ticks', type=int, default=1000, help='ticks to step every game')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    args = parser.parse_args()
+
+    if args.workers:
+        env = ProcessBatchEnv(args.games, args.workers, args.seed)
+    else:
+        env = BatchEnv(args.games, args.seed)
+    env.reset()
+
+    random = numpy.random.RandomState(args.seed)
+    deaths = 0
+    rewards = 0.0
+    best_wave = 0
+    start = time.time()
+    for tick in range(args.ticks):
+        observations, reward, done, info = env.step(random_actions(random, args.games))
+        deaths += done.sum()
+        rewards += reward.sum()
+        best_wave = max(best_wave, info['wave'].max())
+    elapsed = max(time.time() - start, 0.000001)
+
+    if args.workers:
+        env.close()
+
+    print '%d games x %d ticks in %.2f s: %.0f game ticks/second' % (args.games, args.ticks, elapsed, args.games * args.ticks / elapsed)
+    print '%d deaths, total reward %.0f, best wave %d' % (deaths, rewards, best_wave)
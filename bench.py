@@ -0,0 +1,206 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+# Scripted stress scenarios for measuring the game's performance.
+#
+#   python bench.py                      run every scenario and print a table
+#   python bench.py --json results.json  also write the results as JSON
+#   python bench.py wave20 --ticks 2000  run just one scenario
+#
+# Scenarios are seeded so results can be compared between commits.
+
+import os, sys, json, random, argparse
+from timeit import default_timer as timer
+
+# draw and flip are still measured, into a display that is never shown
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from pygame.locals import *
+import main
+from profiler import percentile
+
+PHASES = ('update', 'collision', 'draw', 'flip')
+
+def start_game(wave, rocks):
+    """a fresh game at the given wave with rocks already spawned."""
+    main.stop_game()
+    render_mode, display_depth = main.g.render_mode, main.g.display_depth
+    main.g = main.Globals()
+    main.g.render_mode, main.g.display_depth = render_mode, display_depth
+    main.new_game()
+    if main.screen:
+        main.set_quality(main.governor.level)
+    # the benchmark should not end because the ship was hit
+    main.g.lives = 1000000000
+
+    main.g.wave = wave - 1
+    main.new_wave()
+    fill_rocks(rocks)
+
+def fill_rocks(rocks):
+    main.g.wave_rocks_left = max(main.g.wave_rocks_left, rocks)
+    for i in range(rocks - len(main.rock_group)):
+        main.rock_spawner()
+
+def fire(shots):
+    # spread the shots around the ship so they don't all hit the same rock
+    ship = main.my_ship
+    for shot in range(shots):
+        ship.angle += 360.0 / shots
+        ship.shoot()
+
+class Scenario:
+    def __init__(self, name, description, wave, rocks, shots_per_tick = 0, fire_every = 1, keep_rocks = False):
+        self.name = name
+        self.description = description
+        self.wave = wave
+        self.rocks = rocks
+        self.shots_per_tick = shots_per_tick
+        self.fire_every = fire_every
+        self.keep_rocks = keep_rocks
+
+    def setup(self):
+        start_game(self.wave, self.rocks)
+
+    def before_tick(self, tick):
+        if self.keep_rocks:
+            fill_rocks(self.rocks)
+        if self.shots_per_tick and tick % self.fire_every == 0:
+            fire(self.shots_per_tick)
+
+scenarios = [
+    Scenario('wave1', 'the first wave with the player firing every 10 ticks', 1, 0, 1, 10),
+    Scenario('wave20', 'wave 20 with all 100 rocks on screen', 20, 100, 1, 10, True),
+    Scenario('crowd', '500 rocks and about 200 missiles in flight', 1, 500, 2, 1, True),
+    Scenario('storm', 'continuous fire into 150 rocks, the field stays full of explosions', 3, 150, 8, 1, True),
+]
+
+def run(scenario, ticks, warmup, seed, display):
+    random.seed(seed)
+    scenario.setup()
+
+    times = dict([(phase, []) for phase in PHASES])
+    frame_times = []
+    start = timer()
+    for tick in range(warmup + ticks):
+        scenario.before_tick(tick)
+
+        t0 = timer()
+        main.begin_tick(())
+        main.update_sprites()
+        t1 = timer()
+        main.handle_collisions()
+        t2 = timer()
+        if display:
+            main.draw(main.screen)
+        t3 = timer()
+        if display:
+            main.renderer.present()
+        t4 = timer()
+
+        if tick == warmup:
+            start = t0
+        if tick >= warmup:
+            times['update'].append(t1 - t0)
+            times['collision'].append(t2 - t1)
+            times['draw'].append(t3 - t2)
+            times['flip'].append(t4 - t3)
+            frame_times.append(t4 - t0)
+    elapsed = timer() - start
+
+    result = {
+        'scenario': scenario.name,
+        'description': scenario.description,
+        'seed': seed,
+        'ticks': ticks,
+        'ticks_per_second': ticks / elapsed if elapsed else 0.0,
+        'rocks': len(main.rock_group),
+        'missiles': len(main.missile_group),
+        'explosions': len(main.explosion_group),
+        'phases': {},
+    }
+    for phase, values in [('frame', frame_times)] + [(phase, times[phase]) for phase in PHASES]:
+        result['phases'][phase] = {
+            'p50_ms': percentile(values, 0.5) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+        }
+    return result
+
+def print_result(result):
+    print '%s: %s' % (result['scenario'], result['description'])
+    print '  %.0f ticks/second, ended with %d rocks, %d missiles, %d explosions' % (
+        result['ticks_per_second'], result['rocks'], result['missiles'], result['explosions'])
+    for phase in ('frame',) + PHASES:
+        p = result['phases'][phase]
+        print '  %-10s p50 %7.3f ms  p95 %7.3f ms  p99 %7.3f ms' % (phase, p['p50_ms'], p['p95_ms'], p['p99_ms'])
+
+def main_bench(argv):
+    names = [s.name for s in scenarios]
+    parser = argparse.ArgumentParser(description='Benchmark Yet Another Space Shooter')
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO', help='scenarios to run, from: ' + ', '.join(names))
+    parser.add_argument('--ticks', type=int, default=1000, help='ticks measured per scenario')
+    parser.add_argument('--warmup', type=int, default=60, help='ticks run before measuring starts')
+    parser.add_argument('--seed', type=int, default=1, help='random seed used by every scenario')
+    parser.add_argument('--no-display', action='store_true', help='skip draw and flip, only the simulation is measured')
+    parser.add_argument('--render', choices=('flip', 'dirty'), default='flip', help='how frames are presented')
+    parser.add_argument('--depth', type=int, default=32, choices=(8, 16, 24, 32),
+        help="bits per pixel of the screen; SDL's dummy display gives 8 unless asked, which isn't what the game draws to")
+    parser.add_argument('--quality', type=int, default=0, choices=range(len(main.g.quality_levels)),
+        help='quality level to draw at, 0 being the best')
+    parser.add_argument('--json', metavar='FILE', help="write the results as JSON to FILE ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    for name in args.scenarios:
+        if name not in names:
+            parser.error('unknown scenario %s' % name)
+
+    display = not args.no_display
+    main.g.render_mode = args.render
+    main.g.display_depth = args.depth
+    main.governor.set_level(args.quality)
+    if display:
+        main.init_display()
+        main.set_up_splash()
+    else:
+        main.init_headless()
+
+    results = []
+    for scenario in scenarios:
+        if args.scenarios and scenario.name not in args.scenarios:
+            continue
+        result = run(scenario, args.ticks, args.warmup, args.seed, display)
+        results.append(result)
+        if args.json != '-':
+            print_result(result)
+
+    if args.json:
+        report = {'python': sys.version.split()[0], 'pygame': pygame.version.ver, 'display': display, 'render': args.render, 'depth': args.depth, 'quality': args.quality, 'results': results}
+        if args.json == '-':
+            print json.dumps(report, indent=2, sort_keys=True)
+        else:
+            f = open(args.json, 'w')
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.close()
+
+if __name__ == '__main__':
+    main_bench(sys.argv[1:])
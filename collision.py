@@ -0,0 +1,179 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+import math
+
+import pygame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class SpatialHash:
+    """uniform grid over the play field used as a collision broadphase.
+
+    The play field wraps around at its edges so the grid does too, a
+    query always looks at the 3x3 block of cells around a position.
+    The cell size must be at least the largest sum of two radii.
+    """
+
+    def __init__(self, width, height, cell_size):
+        self.cell_size = float(cell_size)
+        self.columns = max(1, int(math.ceil(width / self.cell_size)))
+        self.rows = max(1, int(math.ceil(height / self.cell_size)))
+        self.cells = {}
+
+        # the neighbouring cells of every cell, worked out once
+        self.neighbours = {}
+        for column in range(self.columns):
+            for row in range(self.rows):
+                cells = []
+                for dc in (-1, 0, 1):
+                    for dr in (-1, 0, 1):
+                        cell = ((column + dc) % self.columns, (row + dr) % self.rows)
+                        if cell not in cells:
+                            cells.append(cell)
+                self.neighbours[(column, row)] = cells
+
+    def get_cell(self, pos):
+        return (int(pos[0] // self.cell_size) % self.columns, int(pos[1] // self.cell_size) % self.rows)
+
+    def rebuild(self, sprites):
+        self.cells = {}
+        for sprite in sprites:
+            self.insert(sprite)
+
+    def insert(self, sprite):
+        cell = self.get_cell(sprite.get_position())
+        if cell in self.cells:
+            self.cells[cell].append(sprite)
+        else:
+            self.cells[cell] = [sprite]
+
+    def remove(self, sprite):
+        cell = self.get_cell(sprite.get_position())
+        if cell in self.cells and sprite in self.cells[cell]:
+            self.cells[cell].remove(sprite)
+
+    def query(self, pos):
+        candidates = []
+        for cell in self.neighbours[self.get_cell(pos)]:
+            if cell in self.cells:
+                candidates.extend(self.cells[cell])
+        return candidates
+
+    def __len__(self):
+        return sum([len(sprites) for sprites in self.cells.values()])
+
+def mask_from_surface(surface):
+    """a collision mask of the pixels that show.
+
+    pygame.mask.from_surface() compares a colorkey with whole pixels, alpha
+    included, so the same image can give different masks in different
+    pixel formats. Here per-pixel alpha decides when there is any, as it
+    does when SDL blits, otherwise only the colorkey's colour is left out.
+    """
+    if surface.get_flags() & pygame.SRCALPHA:
+        if surface.get_colorkey() is not None:
+            surface = surface.copy()
+            surface.set_colorkey(None)
+        return pygame.mask.from_surface(surface, 127)
+    key = surface.get_colorkey()
+    if key is None:
+        mask = pygame.mask.Mask(surface.get_size())
+        mask.fill()
+        return mask
+    mask = pygame.mask.from_threshold(surface, key, (1, 1, 1, 255))
+    mask.invert()
+    return mask
+
+def circle_overlaps(pos1, radius1, pos2, radius2, squared = True):
+    """every pair of overlapping circles between two sets, as two index arrays.
+
+    Positions are (n, 2) and radii (n,) arrays. The second set is sorted on
+    x so each circle of the first set only measures against the ones in
+    reach, the pairs come back ordered by the first index then the second.
+    Like the single tests, distances don't wrap around the screen.
+    """
+    pos1 = numpy.asarray(pos1, dtype=float).reshape(-1, 2)
+    pos2 = numpy.asarray(pos2, dtype=float).reshape(-1, 2)
+    radius1 = numpy.asarray(radius1, dtype=float)
+    radius2 = numpy.asarray(radius2, dtype=float)
+    if len(pos1) == 0 or len(pos2) == 0:
+        return numpy.zeros(0, dtype=int), numpy.zeros(0, dtype=int)
+
+    order = numpy.argsort(pos2[:, 0], kind='mergesort')
+    xs = pos2[order, 0]
+    reach = radius1 + radius2.max()
+    low = numpy.searchsorted(xs, pos1[:, 0] - reach, 'left')
+    counts = numpy.searchsorted(xs, pos1[:, 0] + reach, 'right') - low
+    # spread each circle's range of sorted neighbours out into pairs
+    first = numpy.repeat(numpy.arange(len(pos1)), counts)
+    starts = numpy.cumsum(counts) - counts
+    second = order[numpy.arange(counts.sum()) - numpy.repeat(starts - low, counts)]
+
+    dx = pos1[first, 0] - pos2[second, 0]
+    dy = pos1[first, 1] - pos2[second, 1]
+    reach = radius1[first] + radius2[second]
+    if squared:
+        hit = dx * dx + dy * dy < reach * reach
+    else:
+        hit = numpy.sqrt(dx * dx + dy * dy) < reach
+    first = first[hit]
+    second = second[hit]
+    ordered = numpy.lexsort((second, first))
+    return first[ordered], second[ordered]
+
+class MaskTester:
+    """pixel overlap tests for pairs that already passed the circle test.
+
+    Masks of unrotated images are made on first use and kept, from the
+    source given to add_source() if there is one. Callers pass the masks
+    and their top left corners, rotated masks come from RotationCache and
+    FrameRotationTable.
+    """
+
+    def __init__(self):
+        self.masks = {}
+        self.sources = {}
+        self.tests = 0
+        self.hits = 0
+
+    def add_source(self, image, source):
+        # the image as loaded, masks of image are made from it instead
+        self.sources[image] = source
+        self.masks.pop(image, None)
+
+    def get_image_mask(self, image):
+        mask = self.masks.get(image)
+        if mask is None:
+            mask = self.masks[image] = mask_from_surface(self.sources.get(image, image))
+        return mask
+
+    def overlap(self, mask, pos, other, other_pos):
+        self.tests += 1
+        offset = (int(round(other_pos[0] - pos[0])), int(round(other_pos[1] - pos[1])))
+        if mask.overlap(other, offset) is None:
+            return False
+        self.hits += 1
+        return True
+
+    def report(self):
+        return "%d image masks, %d mask tests, %d hits" % (len(self.masks), self.tests, self.hits)
@@ -0,0 +1,365 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+import sys
+from array import array
+from collections import OrderedDict
+
+import pygame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# values saved for each sprite by EntityGroup.get_state(): pos, prev_pos, vel, angle, angle_vel, age
+STATE_VALUES = 9
+
+def to_little_endian(values):
+    # an array.array as little endian bytes, the order numpy is told to use too
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tostring()
+
+def from_little_endian(typecode, data):
+    values = array(typecode)
+    values.fromstring(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+class StoreField(object):
+    """a Sprite attribute that lives in an EntityStore once the sprite joins one.
+
+    Until then (or if numpy is missing) the value is kept on the sprite itself.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, sprite, cls):
+        if sprite is None:
+            return self
+        store = sprite.__dict__.get('store')
+        if store is None:
+            return sprite.__dict__[self.name]
+        return getattr(store, self.name)[sprite.__dict__['slot']]
+
+    def __set__(self, sprite, value):
+        store = sprite.__dict__.get('store')
+        if store is None:
+            sprite.__dict__[self.name] = value
+        else:
+            getattr(store, self.name)[sprite.__dict__['slot']] = value
+
+class EntityStore:
+    """contiguous arrays holding the motion state of a group of sprites.
+
+    Each sprite owns one slot. Freed slots are reused before the arrays grow.
+    """
+
+    fields = ('pos', 'vel', 'angle', 'angle_vel', 'age', 'lifespan', 'radius')
+
+    def __init__(self, capacity = 64):
+        self.capacity = 0
+        self.used = 0
+        self.free = []
+        self.sprites = []
+
+        self.pos = numpy.zeros((0, 2))
+        # where each slot was before the last step, for drawing between ticks
+        self.prev_pos = numpy.zeros((0, 2))
+        self.vel = numpy.zeros((0, 2))
+        self.angle = numpy.zeros(0)
+        self.angle_vel = numpy.zeros(0)
+        self.age = numpy.zeros(0)
+        self.lifespan = numpy.zeros(0)
+        self.radius = numpy.zeros(0)
+        self.alive = numpy.zeros(0, dtype=bool)
+
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+        self.pos = numpy.concatenate((self.pos, numpy.zeros((extra, 2))))
+        self.prev_pos = numpy.concatenate((self.prev_pos, numpy.zeros((extra, 2))))
+        self.vel = numpy.concatenate((self.vel, numpy.zeros((extra, 2))))
+        self.angle = numpy.concatenate((self.angle, numpy.zeros(extra)))
+        self.angle_vel = numpy.concatenate((self.angle_vel, numpy.zeros(extra)))
+        self.age = numpy.concatenate((self.age, numpy.zeros(extra)))
+        self.lifespan = numpy.concatenate((self.lifespan, numpy.zeros(extra)))
+        self.radius = numpy.concatenate((self.radius, numpy.zeros(extra)))
+        self.alive = numpy.concatenate((self.alive, numpy.zeros(extra, dtype=bool)))
+        self.sprites.extend([None] * extra)
+        self.capacity = capacity
+
+    def attach(self, sprite):
+        if self.free:
+            slot = self.free.pop()
+        else:
+            if self.used == self.capacity:
+                self.grow(self.capacity * 2)
+            slot = self.used
+            self.used += 1
+
+        # move the sprite's values into the arrays, from now on StoreField reads them from here
+        values = sprite.__dict__
+        for name in self.fields:
+            getattr(self, name)[slot] = values.pop(name)
+        self.prev_pos[slot] = self.pos[slot]
+        values['store'] = self
+        values['slot'] = slot
+        self.alive[slot] = True
+        self.sprites[slot] = sprite
+
+    def detach(self, sprite):
+        slot = sprite.slot
+        # hand the sprite its own copy of its values so it stays usable
+        values = sprite.__dict__
+        values['pos'] = [self.pos[slot, 0], self.pos[slot, 1]]
+        values['vel'] = [self.vel[slot, 0], self.vel[slot, 1]]
+        for name in ('angle', 'angle_vel', 'age', 'lifespan', 'radius'):
+            values[name] = getattr(self, name)[slot].item()
+        values['store'] = None
+        del values['slot']
+        self.alive[slot] = False
+        self.sprites[slot] = None
+        self.free.append(slot)
+
+    def step(self, width, height):
+        # move, wrap and age every slot in one go, dead slots are ignored later
+        n = self.used
+        self.angle[:n] += self.angle_vel[:n]
+        self.prev_pos[:n] = self.pos[:n]
+        self.pos[:n] += self.vel[:n]
+        numpy.mod(self.pos[:n], (width, height), out=self.pos[:n])
+        self.age[:n] += 1
+
+    def get_offsets(self, alpha, width, height):
+        # how far each slot is drawn from its position, alpha of the way from the last one
+        n = self.used
+        moved = self.pos[:n] - self.prev_pos[:n]
+        offsets = moved * (alpha - 1)
+        # whatever wrapped round the screen is drawn where it is now
+        offsets[(numpy.abs(moved) > (width / 2, height / 2)).any(1)] = 0
+        return numpy.rint(offsets).astype(int).tolist()
+
+    def get_state(self):
+        # the occupied slots and their values, as little endian bytes
+        n = self.used
+        slots = numpy.flatnonzero(self.alive[:n])
+        values = numpy.column_stack((self.pos[slots], self.prev_pos[slots], self.vel[slots],
+            self.angle[slots], self.angle_vel[slots], self.age[slots]))
+        return (slots.astype('<i4').tostring(), n, numpy.array(self.free, dtype='<i4').tostring(),
+            values.astype('<f8').tostring())
+
+    def set_values(self, slots, values):
+        self.pos[slots] = values[:, 0:2]
+        self.prev_pos[slots] = values[:, 2:4]
+        self.vel[slots] = values[:, 4:6]
+        self.angle[slots] = values[:, 6]
+        self.angle_vel[slots] = values[:, 7]
+        self.age[slots] = values[:, 8]
+
+    def get_live(self):
+        # occupied slots in the order sprites() lists them
+        return numpy.flatnonzero(self.alive[:self.used])
+
+    def get_old(self):
+        n = self.used
+        old = numpy.flatnonzero(self.alive[:n] & (self.age[:n] > self.lifespan[:n]))
+        return [self.sprites[slot] for slot in old]
+
+    def __len__(self):
+        return self.used - len(self.free)
+
+class EntityGroup(pygame.sprite.RenderUpdates):
+    """a sprite group whose members' motion is updated as arrays.
+
+    Without numpy it behaves like an ordinary RenderUpdates. Either way the
+    sprites come out in the same order on every run, so a game can be replayed.
+    """
+
+    def __init__(self, width, height, *sprites):
+        self.width = width
+        self.height = height
+        pygame.sprite.RenderUpdates.__init__(self)
+        if numpy:
+            self.store = EntityStore()
+        else:
+            # a plain dict would order the sprites by their memory addresses
+            self.store = None
+            self.spritedict = OrderedDict()
+        self.add(*sprites)
+
+    def sprites(self):
+        if self.store is None:
+            return list(self.spritedict)
+        # store slots are handed out in the same order every run
+        return [sprite for sprite in self.store.sprites[:self.store.used] if sprite is not None]
+
+    def add_internal(self, sprite):
+        pygame.sprite.RenderUpdates.add_internal(self, sprite)
+        if self.store is not None:
+            self.store.attach(sprite)
+
+    def remove_internal(self, sprite):
+        if self.store is not None:
+            self.store.detach(sprite)
+        pygame.sprite.RenderUpdates.remove_internal(self, sprite)
+        # pooled sprites go back to their pool as soon as they leave the game
+        pool = getattr(sprite, 'pool', None)
+        if pool is not None:
+            pool.release(sprite)
+
+    def update(self, *args):
+        if self.store is None:
+            pygame.sprite.RenderUpdates.update(self, *args)
+            return
+
+        # images and rects wait for refresh(), which is only worth doing for a frame that is drawn
+        self.store.step(self.width, self.height)
+
+    def draw(self, surface, alpha = 1.0):
+        # like RenderUpdates.draw but with a single Surface.blits call,
+        # sprites sharing an image (explosions of the same age) go out together
+        sprites = self.sprites()
+        spritedict = self.spritedict
+        dirty = self.lostsprites
+        self.lostsprites = []
+        if alpha >= 1.0:
+            rects = surface.blits([(sprite.image, sprite.rect) for sprite in sprites])
+        else:
+            rects = surface.blits(zip([sprite.image for sprite in sprites], self.get_draw_rects(sprites, alpha)))
+        for sprite, rect in zip(sprites, rects):
+            old = spritedict[sprite]
+            if not old:
+                dirty.append(rect)
+            elif rect.colliderect(old):
+                dirty.append(rect.union(old))
+            else:
+                dirty.append(rect)
+                dirty.append(old)
+            spritedict[sprite] = rect
+        return dirty
+
+    def get_draw_rects(self, sprites, alpha):
+        # each sprite's rect moved back to alpha of the way between its last two ticks
+        if self.store is None:
+            offsets = [sprite.get_offset(alpha, self.width, self.height) for sprite in sprites]
+        else:
+            by_slot = self.store.get_offsets(alpha, self.width, self.height)
+            offsets = [by_slot[sprite.slot] for sprite in sprites]
+        return [sprite.rect.move(offset) for sprite, offset in zip(sprites, offsets)]
+
+    def get_state(self):
+        """the group's sprites as (slots, used, free, values), see set_state()."""
+        if self.store is not None:
+            return self.store.get_state()
+        values = array('d')
+        for sprite in self.sprites():
+            values.extend(sprite.pos)
+            values.extend(sprite.prev_pos)
+            values.extend(sprite.vel)
+            values.extend((sprite.angle, sprite.angle_vel, sprite.age))
+        slots = array('i', range(len(values) / STATE_VALUES))
+        return (to_little_endian(slots), len(slots), '', to_little_endian(values))
+
+    def set_state(self, make, slots, used, free, values):
+        """put the group back as get_state() found it.
+
+        make() returns a new sprite of the group's kind. Sprites already in
+        a slot that is wanted again are kept and given the old values, so
+        only the difference in numbers is made or removed. Every sprite goes
+        back into its old slot, so they come out in the same order as
+        before and a restored game plays out the same way. Images and
+        rects are left as they were until refresh() is called.
+        """
+        if self.store is None:
+            # the sprites are kept in order, the first ones are reused
+            values = from_little_endian('d', values)
+            count = len(values) / STATE_VALUES
+            sprites = self.sprites()
+            if len(sprites) > count:
+                self.remove(*sprites[count:])
+                del sprites[count:]
+            while len(sprites) < count:
+                sprite = make()
+                if sprite is None:
+                    break
+                self.add(sprite)
+                sprites.append(sprite)
+            for i, sprite in zip(range(0, len(values), STATE_VALUES), sprites):
+                sprite.pos = [values[i], values[i + 1]]
+                sprite.prev_pos = [values[i + 2], values[i + 3]]
+                sprite.vel = [values[i + 4], values[i + 5]]
+                sprite.angle, sprite.angle_vel, sprite.age = values[i + 6:i + 9]
+            return
+
+        store = self.store
+        slots = numpy.frombuffer(slots, dtype='<i4').astype(int)
+        values = numpy.frombuffer(values, dtype='<f8').reshape(-1, STATE_VALUES)
+        store.grow(used)
+        unwanted = store.alive.copy()
+        unwanted[slots] = False
+        if unwanted.any():
+            self.remove(*[store.sprites[slot] for slot in numpy.flatnonzero(unwanted)])
+
+        # attach() takes slots from the end of the free list
+        missing = slots[~store.alive[slots]]
+        store.used = max(store.used, used)
+        store.free = missing[::-1].tolist()
+        sprites = []
+        for slot in missing:
+            sprite = make()
+            if sprite is None:
+                break
+            sprites.append(sprite)
+        self.add(*sprites)
+        # a pool that ran dry leaves some slots empty
+        made = store.alive[slots]
+        store.used = used
+        store.free = numpy.frombuffer(free, dtype='<i4').tolist()
+
+        slots = slots[made]
+        store.set_values(slots, values[made])
+
+    def refresh(self):
+        if self.store is None:
+            for sprite in self.sprites():
+                sprite.refresh()
+            return
+        # every StoreField read is a numpy lookup, so hand each sprite plain
+        # floats taken from the arrays in one go
+        store = self.store
+        slots = store.get_live()
+        for sprite, pos, angle, age in zip([store.sprites[slot] for slot in slots], store.pos[slots].tolist(),
+                store.angle[slots].tolist(), store.age[slots].tolist()):
+            sprite.refresh(pos, angle, age)
+
+    def remove_old(self):
+        if self.store is None:
+            old = [s for s in self if s.is_old()]
+        else:
+            old = self.store.get_old()
+        if old:
+            self.remove(*old)
@@ -0,0 +1,130 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+import gc, sys
+from array import array
+from timeit import default_timer as timer
+
+from profiler import percentile
+
+POLICIES = ('auto', 'frame', 'waves')
+
+class GCMonitor:
+    """runs the cyclic garbage collector itself so its pauses can be timed and placed.
+
+    Python 2 has no gc.callbacks or tracemalloc, so with any policy but
+    'auto' automatic collection is switched off and collect() does the
+    work, timing each pass.
+      'auto'   leaves the collector alone, nothing is measured
+      'frame'  collects at the end of a frame whenever the collector's own
+               thresholds say one is due
+      'waves'  collects when told to, between waves, and only otherwise
+               if the young generation grows past limit
+    Allocations are every object made when CPython was built with
+    COUNT_ALLOCS, which gives sys.getcounts(). Otherwise the youngest
+    generation's count is all there is, and freeing a container takes it
+    back off, so it is the net growth in containers (lists, dicts,
+    instances) and garbage made and dropped within a phase doesn't show.
+    """
+
+    def __init__(self, policy = 'auto', capacity = 3600, limit = 200000):
+        self.capacity = capacity
+        self.limit = limit
+        self.thresholds = gc.get_threshold()
+        self.pauses = array('d', [0.0]) * capacity
+        self.frames = 0
+        self.frame_pause = 0.0
+        self.collections = [0, 0, 0]
+        self.total_pause = 0.0
+        self.longest_pause = 0.0
+        # objects counted before each collection reset the count
+        self.allocated = 0
+        self.gross = hasattr(sys, 'getcounts')
+        if self.gross:
+            # sys.getcounts() makes a tuple for every type, which isn't the game's doing
+            self.calls = 0
+            first = self.count_objects()
+            self.call_cost = self.count_objects() - first
+        self.set_policy(policy)
+
+    def set_policy(self, policy):
+        self.policy = policy
+        if policy == 'auto':
+            gc.enable()
+        else:
+            gc.disable()
+
+    def count_objects(self):
+        return sum([allocs for name, allocs, frees, most in sys.getcounts()])
+
+    def get_allocated(self):
+        if self.gross:
+            self.calls += 1
+            return self.count_objects() - self.calls * self.call_cost
+        # only keeps rising while automatic collection is off
+        return self.allocated + gc.get_count()[0]
+
+    def get_allocation_name(self):
+        if self.gross:
+            return 'allocations'
+        return 'net new containers'
+
+    def collect(self, generation = 2):
+        self.allocated += gc.get_count()[0]
+        start = timer()
+        gc.collect(generation)
+        pause = timer() - start
+        self.frame_pause += pause
+        self.total_pause += pause
+        self.longest_pause = max(self.longest_pause, pause)
+        self.collections[generation] += 1
+
+    def collect_due(self):
+        # the interpreter's rule: the oldest generation whose count is over its threshold
+        counts = gc.get_count()
+        for generation in (2, 1, 0):
+            if counts[generation] > self.thresholds[generation]:
+                self.collect(generation)
+                return
+
+    def between_waves(self):
+        if self.policy == 'waves':
+            self.collect()
+
+    def end_frame(self):
+        if self.policy == 'frame':
+            self.collect_due()
+        elif self.policy == 'waves' and gc.get_count()[0] > self.limit:
+            self.collect_due()
+        self.pauses[self.frames % self.capacity] = self.frame_pause
+        self.frames += 1
+        self.frame_pause = 0.0
+
+    def get_pauses(self):
+        count = min(self.frames, self.capacity)
+        return [self.pauses[i % self.capacity] for i in range(self.frames - count, self.frames)]
+
+    def report(self):
+        pauses = self.get_pauses()
+        if not pauses:
+            return "policy %s, no frames" % self.policy
+        p99 = percentile(pauses, 0.99)
+        paused = len([p for p in pauses if p > 0])
+        return "policy %s, %d/%d/%d collections, %d frames paused, p99 %.2f ms, longest %.2f ms, %.1f ms in total" % (self.policy,
+            self.collections[0], self.collections[1], self.collections[2], paused, p99 * 1000, self.longest_pause * 1000, self.total_pause * 1000)
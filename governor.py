@@ -0,0 +1,83 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+from collections import deque
+
+class QualityGovernor:
+    """steps quality down while frames run over budget and back up when there is room.
+
+    Level 0 is full quality, levels - 1 the lowest. Each frame's busy time
+    goes into a rolling window. A full window averaging over budget drops a
+    level. Averaging under recover times the budget for hold frames in a
+    row raises one. The window starts over after every change so the new
+    level is judged on its own frames.
+    """
+
+    def __init__(self, levels, budget, window = 30, recover = 0.6, hold = 180):
+        self.levels = levels
+        self.budget = budget
+        self.recover = recover
+        self.hold = hold
+        self.samples = deque(maxlen=window)
+        self.level = 0
+        self.enabled = True
+        self.headroom = 0
+        self.drops = 0
+        self.raises = 0
+
+    def reset(self):
+        self.samples.clear()
+        self.headroom = 0
+
+    def set_level(self, level):
+        self.level = max(0, min(self.levels - 1, level))
+        self.reset()
+
+    def get_average(self):
+        if not self.samples:
+            return 0.0
+        return sum(self.samples) / len(self.samples)
+
+    def update(self, frame_time):
+        """add a frame's busy time, returns True if the level changed."""
+        if not self.enabled:
+            return False
+        self.samples.append(frame_time)
+        if len(self.samples) < self.samples.maxlen:
+            return False
+
+        average = self.get_average()
+        if average > self.budget:
+            self.headroom = 0
+            if self.level < self.levels - 1:
+                self.set_level(self.level + 1)
+                self.drops += 1
+                return True
+        elif average < self.budget * self.recover:
+            self.headroom += 1
+            if self.headroom >= self.hold and self.level > 0:
+                self.set_level(self.level - 1)
+                self.raises += 1
+                return True
+        else:
+            self.headroom = 0
+        return False
+
+    def report(self):
+        return "level %d/%d, %.2f ms average, %d drops, %d raises" % (self.level, self.levels - 1, self.get_average() * 1000, self.drops, self.raises)
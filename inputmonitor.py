@@ -0,0 +1,99 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+from collections import deque
+from timeit import default_timer as timer
+
+import pygame
+from pygame.locals import QUIT, KEYDOWN, KEYUP, MOUSEBUTTONDOWN
+
+from profiler import percentile
+
+PACING = ('tick', 'busy')
+
+# the only events the game acts on, anything else can stay out of the queue
+ALLOWED_EVENTS = (QUIT, KEYDOWN, KEYUP, MOUSEBUTTONDOWN)
+INPUT_EVENTS = (KEYDOWN, KEYUP, MOUSEBUTTONDOWN)
+
+def filter_events():
+    # blocked events are dropped by SDL and never become Python objects
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(list(ALLOWED_EVENTS))
+
+class InputMonitor:
+    """times how long input takes to get from the event queue to the screen.
+
+    SDL 1.2 events don't say when they happened, so each poll is timed
+    instead. An input is counted once a tick has used it and the frame
+    showing that tick has been flipped. Poll to flip is exact; the event
+    could have been waiting since the poll before, so previous poll to flip
+    is kept too as the most it can have been.
+    """
+
+    def __init__(self, capacity = 3600):
+        self.enabled = False
+        self.latencies = deque(maxlen = capacity)
+        self.bounds = deque(maxlen = capacity)
+        self.last_poll = timer()
+        # (poll time, previous poll time) of inputs not yet used by a tick,
+        # and of those used but not yet on screen
+        self.pending = []
+        self.applied = []
+        self.polls = 0
+        self.events = 0
+        self.inputs = 0
+
+    def poll(self):
+        """drain the event queue, returns the events."""
+        events = pygame.event.get()
+        if not self.enabled:
+            return events
+        now = timer()
+        self.polls += 1
+        self.events += len(events)
+        for event in events:
+            if event.type in INPUT_EVENTS:
+                self.inputs += 1
+                self.pending.append((now, self.last_poll))
+        self.last_poll = now
+        return events
+
+    def ticked(self):
+        # the inputs polled so far are in the game state now
+        if self.pending:
+            self.applied += self.pending
+            self.pending = []
+
+    def flipped(self):
+        if not self.applied:
+            return
+        now = timer()
+        for polled, previous in self.applied:
+            self.latencies.append(now - polled)
+            self.bounds.append(now - previous)
+        self.applied = []
+
+    def report(self):
+        if not self.latencies:
+            return "%d polls, %d events, no input shown yet" % (self.polls, self.events)
+        return "%d inputs, poll to flip p50 %.1f ms p95 %.1f ms p99 %.1f ms, at most p50 %.1f ms p95 %.1f ms p99 %.1f ms, %.2f events a poll" % (
+            self.inputs, percentile(self.latencies, 0.5) * 1000, percentile(self.latencies, 0.95) * 1000,
+            percentile(self.latencies, 0.99) * 1000, percentile(self.bounds, 0.5) * 1000,
+            percentile(self.bounds, 0.95) * 1000, percentile(self.bounds, 0.99) * 1000,
+            float(self.events) / max(1, self.polls))
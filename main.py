@@ -17,7 +17,11 @@
 # license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
 #
 
-import os, pygame
+import time
+# start up time is measured from here, before pygame is imported
+launch_time = time.time()
+
+import os, sys, zlib, argparse, threading, pygame
 from pygame.locals import *
 
 if not pygame.font: print 'Warning, fonts disabled'
@@ -25,18 +29,57 @@ if not pygame.mixer: print 'Warning, sound disabled'
 
 import math
 import random
+from collections import OrderedDict
+
+from rotation import RotationCache, FrameRotationTable
+from collision import SpatialHash, MaskTester, circle_overlaps
+from particles import ParticleSystem
+import entities
+from entities import EntityGroup, StoreField
+from profiler import FrameProfiler, draw_overlay
+from render import Renderer, ScaledTarget
+from governor import QualityGovernor
+from gcmonitor import GCMonitor, POLICIES
+from inputmonitor import InputMonitor, PACING, filter_events
+from audio import VoiceManager
+from textcache import TextCache, get_font
+from pools import Pool
+from assetpack import AssetPack
+import recording
+import snapshot
+import net
+
+if not entities.numpy: print 'Warning, numpy missing, entity arrays disabled'
+
+# the values g.mode can take, saved games and recordings store the index
+MODES = ('normal', 'stress')
 
 class Globals:
     
     def __init__(self):
         self.width = 800
         self.height = 600
+        # bits per pixel asked of the display, 0 takes what SDL gives
+        self.display_depth = 0
 
         self.wave = 0
         self.wave_rocks_left = 0
         
         self.lives = 1
+        # the game advances in fixed ticks, g.time counts them
+        self.ticks_per_second = 60
         self.time = 0
+        # frames drawn a second, 0 for as many as the machine manages;
+        # frames between ticks draw the sprites part way along
+        self.frame_rate = 120
+        # how the frame rate is kept: 'tick' sleeps, which can oversleep by
+        # a millisecond or two, 'busy' spins the last part and uses a whole core
+        self.pacing = 'tick'
+        # keep events the game ignores out of the queue, and only read the
+        # queue in frames that run a tick, input waits for one regardless
+        self.fast_input = False
+        # ticks run in one frame to catch up before the game slows down instead
+        self.max_catch_up_ticks = 5
         
         self.playing = False
         self.betweenwaves = False
@@ -44,38 +87,228 @@ class Globals:
         
         self.wavedelaystarttime = 0
 
+        # 'normal', or 'stress': an endless game where the ship can't be
+        # destroyed and ever bigger waves arrive all at once on a timer,
+        # for finding how many rocks the engine can take
+        self.mode = 'normal'
+        self.stress_first_wave = 20
+        self.stress_growth = 1.5
+        self.stress_wave_seconds = 5
+        self.stress_max_rocks = 20000
+        self.next_wave_time = 0
+
+        # a snapshot is taken every tick so backspace can rewind the game,
+        # the oldest are forgotten once they fill this many bytes
+        self.rewind_memory = 8 * 1024 * 1024
+        # F5 saves the game here and F9 loads it again
+        self.save_file = 'yass.sav'
+
+        # the UDP port --serve listens on and --connect uses unless told otherwise
+        self.net_port = 5555
+        # in a two player game, the player left flying when the other was hit
+        self.winner = 0
+
         self.text_antialias = 1
         self.text_color = (255, 255, 255)
         self.text_bg_color = (0, 0, 0)
+        # rendered strings kept around for the HUD and menus
+        self.text_cache_size = 32
+        # and for the timing overlay, whose report lines are made again every overlay_interval frames
+        self.overlay_text_cache_size = 128
+        self.overlay_interval = 15
+
+        # sprites made up front for missiles and explosions, and what to do
+        # when they run out: 'grow', 'drop' or 'recycle' the oldest
+        self.missile_pool_size = 256
+        self.explosion_pool_size = 128
+        self.pool_policy = 'grow'
+
+        # keep converted assets in resources/assets.pack for faster start ups
+        self.asset_pack = True
+        # load what the splash screen doesn't need while it is showing
+        self.background_loading = True
+        # seconds from launch to the first splash frame
+        self.startup_time = None
+
+        # mixer settings, a smaller buffer means less delay before a sound is heard
+        self.mixer_frequency = 44100
+        self.mixer_buffer = 1024
+        # mixer channels set aside for each kind of sound
+        self.voice_budgets = (('engine', 1), ('weapons', 4), ('explosions', 4), ('ui', 1))
+
+        # 'flip' redraws the whole screen every frame, 'dirty' only what changed
+        self.render_mode = 'flip'
+        # 'surface' blits Surfaces onto the screen, 'texture' draws through
+        # SDL's renderer (pygame 2) and turns sprites as it draws them
+        self.backend = 'surface'
+        # for the texture backend, -1 lets SDL choose, 0 is its software renderer
+        self.texture_accelerated = -1
 
         # globals for tuning
         self.ship_turn_speed = 3
         self.friction = 0.98
         self.missile_initial_vel = 5
 
+        # number of pre-rotated images kept for each rotating sprite
+        self.rotation_buckets = 64
+        # rocks further than this from the ship are drawn unrotated, 0 rotates them all
+        self.rotation_distance = 0
+        # most explosions showing at once, 0 for no limit
+        self.max_explosions = 0
+        # frames between updates of the wave and rocks left text
+        self.hud_interval = 1
+        # print how long startup took and the cache, pool and asset reports on exit
+        self.stats = False
+        # the game is drawn at 1/render_scale size and stretched to fit
+        self.render_scale = 1
+
+        # change quality by itself to keep frames within budget
+        self.governor = True
+        # the frame rate it keeps up, frames drawn beyond it aren't worth
+        # lower quality
+        self.target_frame_rate = self.ticks_per_second
+        # the quality levels it steps through, full quality first. Each is
+        # (rock rotation buckets, rotation_distance, max_explosions, hud_interval, render_scale)
+        self.quality_levels = (
+            (self.rotation_buckets, 0, 0, 1, 1),
+            (16, 0, 0, 1, 1),
+            (16, 250, 0, 1, 1),
+            (16, 250, 16, 1, 1),
+            (16, 250, 16, 10, 1),
+            (8, 250, 8, 10, 2),
+        )
+        # the ship turns ship_turn_speed degrees a tick so 120 buckets are exact
+        self.ship_rotation_buckets = 120
+
+        # collision broadphase, cells must be wider than any two radii together
+        self.collision_cell_size = 90
+        # pairs within each other's radius only collide if their pixels overlap
+        self.mask_collisions = True
+        # compare squared distances instead of taking a square root
+        self.collision_squared = True
+
+        # most thrust and debris particles at once, the oldest make way for
+        # new ones; 0 turns them off. They need numpy and a display
+        self.max_particles = 32768
+
+        # frames of phase timings kept for the overlay (F3) and --trace
+        self.profile_frames = 3600
+        self.show_profiler = False
+
 g = Globals()
 my_ship = None
+# the other player's ship in a two player game
+other_ship = None
 splash_surface = None
+end_game_surface = None
+end_game_key = None
+
+text_cache = TextCache(g.text_cache_size)
+overlay_text_cache = TextCache(g.overlay_text_cache_size)
+
+# set up by init_display(), a headless game never has them
+screen = None
+particles = None
+# what frames are drawn on, the screen or the texture renderer
+canvas = None
+background = None
+renderer = None
+hud_font = None
+asset_pack = None
+
+# the game's assets are loaded by this thread while the splash screen shows
+assets_thread = None
+assets_error = None
+# set once load_music() has the soundtrack
+music_loaded = False
+missile_pool = None
+explosion_pool = None
+
+# the Recording that --record is writing
+recorder = None
+# made by main(), bench.py and batchenv.py import the game and never rewind
+rewind_buffer = None
+
+# set by --serve or --connect
+net_server = None
+net_client = None
+# the client's sprites by the server's ids, and the next id the server hands out
+net_sprites = {}
+next_net_id = net.FIRST_ID
+
+class SpriteGroup(EntityGroup):
+    """an EntityGroup that picks the rotated images of its sprites together.
+
+    When every sprite turns through the same RotationCache, the buckets and
+    which sprites are too far away to turn are worked out over the store's
+    arrays, leaving only the images and rects to set one by one. Anything
+    else is refreshed by Sprite.refresh().
+    """
+
+    def refresh(self):
+        sprites = self.sprites()
+        rotations = sprites and sprites[0].rotations
+        if self.store is None or not rotations or g.backend == 'texture' or [s for s in sprites if s.rotations is not rotations or s.animated]:
+            EntityGroup.refresh(self)
+            return
 
-pygame.init()
-screen = pygame.display.set_mode((g.width, g.height))
-pygame.display.set_caption('Yet Another Space Shooter')
-#pygame.mouse.set_visible(0)
-
-missile_group = pygame.sprite.RenderPlain()
-rock_group = pygame.sprite.RenderPlain()
-explosion_group = pygame.sprite.RenderPlain()
+        store = self.store
+        slots = store.get_live()
+        pos = store.pos[slots]
+        angle = store.angle[slots]
+        turned = angle != 0
+        if g.rotation_distance and my_ship:
+            # turned down by the quality governor, far away rocks don't turn
+            dx = pos[:, 0] - my_ship.pos[0]
+            dy = pos[:, 1] - my_ship.pos[1]
+            turned &= dx * dx + dy * dy <= g.rotation_distance * g.rotation_distance
+        for sprite, p, turn, bucket in zip(sprites, pos.tolist(), turned.tolist(), rotations.get_buckets(angle)):
+            if turn:
+                sprite.image = rotations.get_bucket_surface(bucket)
+                place_rect(sprite.rect, p, sprite.image.get_size())
+            else:
+                sprite.image = sprite.original_image
+                place_rect(sprite.rect, p, sprite.image_size)
+
+missile_group = SpriteGroup(g.width, g.height)
+rock_group = SpriteGroup(g.width, g.height)
+explosion_group = SpriteGroup(g.width, g.height)
+
+collision_grid = SpatialHash(g.width, g.height, g.collision_cell_size)
+mask_tester = MaskTester()
+
+# the main loop's phases, in the order they run
+PHASES = ('idle', 'events', 'update', 'prune', 'ship_collide', 'rock_collide', 'snapshot', 'draw', 'hud', 'sprites', 'particles', 'overlay', 'flip', 'gc')
+profiler = FrameProfiler(PHASES, g.profile_frames)
+gc_monitor = GCMonitor('auto', g.profile_frames)
+input_monitor = InputMonitor(g.profile_frames)
+voices = VoiceManager(g.voice_budgets)
+governor = QualityGovernor(len(g.quality_levels), 1.0 / g.ticks_per_second)
+# set while the game is drawn at a lower resolution
+scaled_target = None
+hud_text = None
+hud_age = 0
 
 def load_image(name, colorkey=-1, perpixelalpha=False):
     fullname = os.path.join('resources', name)
     
+    image = None
+    if asset_pack:
+        image = asset_pack.get_image(name, fullname)
+
     try:
-        image = pygame.image.load(fullname)
-        if perpixelalpha:
-            image = image.convert_alpha()
-        else:
-            image = image.convert()
-    except pygame.error, message:
+        if image is None:
+            image = pygame.image.load(fullname)
+            # converting needs a display, without one the image stays as loaded
+            if pygame.display.get_surface() is None:
+                pass
+            elif perpixelalpha:
+                image = image.convert_alpha()
+            else:
+                image = image.convert()
+            if asset_pack:
+                asset_pack.add_image(name, fullname, image)
+    except (pygame.error, EnvironmentError), message:
         print 'Cannot load image:', fullname
         raise SystemExit, message
 
@@ -85,15 +318,44 @@ def load_image(name, colorkey=-1, perpixelalpha=False):
         image.set_colorkey(colorkey, RLEACCEL)
     return image, image.get_rect()
 
+def load_mask_source(name, colorkey=-1):
+    # the image as it is in the file. Collision masks are made from this, as
+    # what convert() makes of an image depends on the display
+    fullname = os.path.join('resources', name)
+    try:
+        image = pygame.image.load(fullname)
+    except (pygame.error, EnvironmentError), message:
+        print 'Cannot load image:', fullname
+        raise SystemExit, message
+    if colorkey is not None:
+        if colorkey is -1:
+            colorkey = image.get_at((0,0))
+        image.set_colorkey(colorkey)
+    return image
+
+def slice_frames(image, size):
+    # cut an animation strip into separate frame surfaces
+    frames = []
+    for left in range(0, image.get_width() - size[0] + 1, size[0]):
+        frames.append(image.subsurface((left, 0), (size[0], size[1])).copy())
+    return frames
+
 def load_sound(name):
     class NoneSound:
         def play(self): pass
+        def stop(self): pass
     if not pygame.mixer or not pygame.mixer.get_init():
         return NoneSound()
     fullname = os.path.join('resources', name)
     try:
-        sound = pygame.mixer.Sound(fullname)
-    except pygame.error, message:
+        sound = None
+        if asset_pack:
+            sound = asset_pack.get_sound(name, fullname)
+        if sound is None:
+            sound = pygame.mixer.Sound(fullname)
+            if asset_pack:
+                asset_pack.add_sound(name, fullname, sound)
+    except (pygame.error, EnvironmentError), message:
         print 'Cannot load sound:', fullname
         raise SystemExit, message
     return sound
@@ -127,30 +389,149 @@ class ImageInfo:
 # art assets created by Kim Lathrop and may be freely re-used in non-commercial projects, please credit Kim.
 
 nebula_info = ImageInfo([400, 300], [800, 600])
-nebula_image, nebula_image_rect = load_image("nebula_blue.png")
-
 splash_info = ImageInfo([200, 150], [400, 300])
-
 ship_info = ImageInfo([45, 45], [90, 90], 35)
-ship_image, ship_image_rect = load_image("double_ship.png", None, True)
-
 missile_info = ImageInfo([5,5], [10, 10], 3, 100)
-missile_image, missile_image_rect = load_image("shot2.png")
-
 asteroid_info = ImageInfo([45, 45], [90, 90], 40)
-asteroid_image, asteroid_image_rect = load_image("asteroid_blue.png", -1, True)
-
 explosion_info = ImageInfo([64, 64], [128, 128], 17, 24, True)
-explosion_image, explosion_image_rect = load_image("explosion_alpha.png", None, True)
 
-soundtrack_path = os.path.join('resources', '516494_Zone-X.mp3')
-pygame.mixer.music.load(soundtrack_path)
-pygame.mixer.music.set_volume(0.4)
+def load_assets():
+    load_splash_assets()
+    load_game_assets()
+
+def load_splash_assets():
+    global nebula_image
+
+    nebula_image, nebula_image_rect = load_image("nebula_blue.png")
+
+def load_game_assets():
+    global ship_image, ship_rotations, missile_image, asteroid_image, asteroid_rotations, explosion_image, explosion_frames
+    global missile_sound, ship_thrust_sound, explosion_sound, end_wave_sound
+
+    ship_image, ship_image_rect = load_image("double_ship.png", None, True)
+    ship_rotations = FrameRotationTable(ship_image, ship_info.get_size(), 2, g.ship_rotation_buckets,
+        load_mask_source("double_ship.png", None))
+
+    missile_image, missile_image_rect = load_image("shot2.png")
+    mask_tester.add_source(missile_image, load_mask_source("shot2.png"))
+
+    asteroid_image, asteroid_image_rect = load_image("asteroid_blue.png", -1, True)
+    asteroid_rotations = RotationCache(asteroid_image, g.rotation_buckets, False, load_mask_source("asteroid_blue.png"))
+
+    explosion_image, explosion_image_rect = load_image("explosion_alpha.png", None, True)
+    explosion_frames = slice_frames(explosion_image, explosion_info.get_size())
+
+    missile_sound = load_sound("laser6.wav")
+    ship_thrust_sound = load_sound("enginehum3.ogg")
+    explosion_sound = load_sound("threeTone1.wav")
+    end_wave_sound = load_sound("threeTone2.wav")
 
-missile_sound = load_sound("laser6.wav")
-ship_thrust_sound = load_sound("enginehum3.ogg")
-explosion_sound = load_sound("threeTone1.wav")
-end_wave_sound = load_sound("threeTone2.wav")
+def create_pools():
+    global missile_pool, explosion_pool
+
+    missiles = Pool(lambda: Sprite([0, 0], [0, 0], 0, 0, missile_image, missile_info), g.missile_pool_size, g.pool_policy)
+    explosions = Pool(lambda: Sprite([0, 0], [0, 0], 0, 0, explosion_image, explosion_info, None, None, explosion_frames), g.explosion_pool_size, g.pool_policy)
+    # this runs in the background loader and the overlay checks missile_pool,
+    # so it is set last, once both exist
+    explosion_pool = explosions
+    missile_pool = missiles
+
+def load_music():
+    global music_loaded
+
+    if pygame.mixer.get_init():
+        # the soundtrack isn't part of the repository, see README.md
+        soundtrack_path = os.path.join('resources', '516494_Zone-X.mp3')
+        try:
+            pygame.mixer.music.load(soundtrack_path)
+        except pygame.error, message:
+            print 'Warning, music disabled:', message
+            return
+        pygame.mixer.music.set_volume(0.4)
+        music_loaded = True
+
+def load_rest_of_game():
+    # everything init_display() leaves for later
+    try:
+        pygame.mixer.init()
+        voices.start(g.mixer_buffer)
+    except pygame.error, message:
+        print 'Warning, sound disabled:', message
+
+    load_game_assets()
+    create_pools()
+    load_music()
+
+    if asset_pack:
+        asset_pack.save()
+
+def load_in_background():
+    global assets_error
+
+    try:
+        load_rest_of_game()
+    except BaseException:
+        # handed to the main thread by ensure_assets(), traceback and all
+        assets_error = sys.exc_info()
+
+def ensure_assets():
+    global assets_thread
+
+    if assets_thread is not None:
+        assets_thread.join()
+        assets_thread = None
+    if assets_error is not None:
+        raise assets_error[0], assets_error[1], assets_error[2]
+
+def init_display():
+    global screen, canvas, background, renderer, hud_font, asset_pack, assets_thread, particles
+
+    # only start what the splash screen needs, the mixer comes up with the rest of the game
+    pygame.mixer.pre_init(g.mixer_frequency, -16, 2, g.mixer_buffer)
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((g.width, g.height), 0, g.display_depth)
+    pygame.display.set_caption('Yet Another Space Shooter')
+    #pygame.mouse.set_visible(0)
+
+    if g.asset_pack:
+        key = {'version': 1, 'bitsize': screen.get_bitsize(), 'masks': list(screen.get_masks())}
+        asset_pack = AssetPack(os.path.join('resources', 'assets.pack'), key)
+
+    load_splash_assets()
+
+    hud_font = get_font("arial",16)
+
+    background = pygame.Surface(screen.get_size()).convert()
+    background.blit(nebula_image, screen.get_rect(), nebula_image.get_rect())
+    renderer = None
+    if g.backend == 'texture':
+        try:
+            from texrender import TextureRenderer
+            renderer = TextureRenderer(background, g.texture_accelerated)
+        except (ImportError, pygame.error), message:
+            print 'Warning, texture backend unavailable, drawing with surfaces:', message
+            g.backend = 'surface'
+    if renderer is None:
+        renderer = Renderer(background, g.render_mode)
+        canvas = screen
+    else:
+        canvas = renderer
+
+    if entities.numpy and g.max_particles:
+        particles = ParticleSystem(g.max_particles, g.width, g.height)
+
+    if g.background_loading:
+        assets_thread = threading.Thread(target=load_in_background)
+        assets_thread.daemon = True
+        assets_thread.start()
+    else:
+        load_rest_of_game()
+
+def init_headless():
+    # no display and no mixer: images are left unconverted and every sound is silent
+    load_assets()
+    create_pools()
 
 # helper functions to handle transformations
 def angle_to_vector(ang):
@@ -163,9 +544,23 @@ def pos_to_rect(pos, size):
     (x, y) = pos_to_top_left(pos, size)
     return pygame.Rect(x, y, size[0], size[1])
 
+def place_rect(rect, pos, size):
+    # like pos_to_rect but moves an existing Rect instead of making a new one
+    rect.size = size
+    rect.topleft = pos_to_top_left(pos, size)
+
+def interpolate(p, q, alpha, width, height):
+    # alpha of the way from p to q, unless q wrapped round the screen
+    if abs(q[0] - p[0]) > width / 2 or abs(q[1] - p[1]) > height / 2:
+        return q
+    return [p[0] + (q[0] - p[0]) * alpha, p[1] + (q[1] - p[1]) * alpha]
+
 def dist(p,q):
     return math.sqrt((p[0]-q[0])**2+(p[1]-q[1])**2)
 
+def dist_sq(p,q):
+    return (p[0]-q[0])**2+(p[1]-q[1])**2
+
 def rand(minimum, maximum):
     return random.random() * (maximum - minimum) + minimum
 
@@ -181,7 +576,7 @@ def rotate_around_center(surface, angle):
 
 # Ship class
 class Ship:
-    def __init__(self, pos, vel, angle, image, info):
+    def __init__(self, pos, vel, angle, image, info, rotations):
         self.pos = [pos[0],pos[1]]
         self.vel = [vel[0],vel[1]]
         self.thrust = False
@@ -191,22 +586,32 @@ class Ship:
         self.image_center = info.get_center()
         self.image_size = info.get_size()
         self.radius = info.get_radius()
+        self.rotations = rotations
+        self.frames = slice_frames(image, self.image_size)
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.prev_pos = list(self.pos)
 
-    def draw(self):
+    def draw(self, screen, alpha = 1.0):
 
-        source_left = 0
+        frame = 0
         if self.thrust:
             # if thrusting we want the 2nd image
-            source_left = self.image_size[0]
+            frame = 1
 
-        self.surface = ship_image.subsurface((source_left,0), (self.image_size[0], self.image_size[1]))
+        # alpha of the way from the last tick's position to this one's
+        pos = interpolate(self.prev_pos, self.pos, alpha, g.width + self.radius, g.height + self.radius)
+        angle = self.angle - self.angle_vel * (1 - alpha)
 
-        rotated_ship_surface = rotate_around_center(self.surface, self.angle)
-        w, h = rotated_ship_surface.get_size()
-        ship_draw_pos = pos_to_top_left(self.pos, (w, h))
-        screen.blit(rotated_ship_surface, ship_draw_pos)
+        if g.backend == 'texture':
+            return screen.draw_rotated(self.frames[frame], pos, angle)
 
-    def update(self):
+        surface, offset = self.rotations.get(frame, angle)
+        return screen.blit(surface, (pos[0] + offset[0], pos[1] + offset[1]))
+
+    def update(self, quiet = False):
+        # quiet moves the ship without a trail, for ticks that are being played again
+        self.prev_pos[0] = self.pos[0]
+        self.prev_pos[1] = self.pos[1]
         self.angle += self.angle_vel
 
         if self.thrust:
@@ -223,7 +628,16 @@ class Ship:
         self.pos[0] %= (g.width + self.radius)
         self.pos[1] %= (g.height + self.radius)
         
-        self.rect = pos_to_rect(self.pos, self.image_size)
+        place_rect(self.rect, self.pos, self.image_size)
+
+        if self.thrust and particles and not quiet:
+            self.exhaust(6)
+
+    def exhaust(self, count):
+        # a trail of particles blown out of the back of the ship
+        v = angle_to_vector(degrees_to_radians(self.angle))
+        pos = (self.pos[0] - v[0] * self.radius * 0.6, self.pos[1] + v[1] * self.radius * 0.6)
+        particles.emit(count, pos, self.vel, 3, 25, (255, 160, 40), self.angle + 180, 15)
 
     def increment_angle_vel(self):
         self.angle_vel += g.ship_turn_speed
@@ -234,7 +648,9 @@ class Ship:
     def thrusters(self, on):
         self.thrust = on
         if (on):
-            ship_thrust_sound.play()
+            voices.play(ship_thrust_sound, 'engine', 2)
+            if particles:
+                self.exhaust(20)
         else:
             ship_thrust_sound.stop()
     
@@ -248,7 +664,9 @@ class Ship:
         vel = list(self.vel)
         vel[0] += vector[0] * g.missile_initial_vel
         vel[1] += -vector[1] * g.missile_initial_vel
-        missile_group.add(Sprite(pos, vel, 0, 0, missile_image, missile_info, missile_sound))
+        missile = missile_pool.acquire(pos, vel, 0, 0, missile_image, missile_info, missile_sound)
+        if missile:
+            missile_group.add(missile)
 
     def get_radius(self):
         return self.radius
@@ -256,12 +674,35 @@ class Ship:
     def get_position(self):
         return self.pos
     
+    def get_mask(self):
+        # the hull without the thrust flame, and its top left corner
+        mask = self.rotations.get_mask(0, self.angle)
+        w, h = mask.get_size()
+        return mask, (self.pos[0] - w / 2, self.pos[1] - h / 2)
+    
 # Sprite class
 class Sprite(pygame.sprite.Sprite):
-    def __init__(self, pos, vel, ang, ang_vel, image, info, sound = None):
+    # held in the group's EntityStore arrays while the sprite is in an EntityGroup
+    pos = StoreField('pos')
+    vel = StoreField('vel')
+    angle = StoreField('angle')
+    angle_vel = StoreField('angle_vel')
+    age = StoreField('age')
+    lifespan = StoreField('lifespan')
+    radius = StoreField('radius')
+
+    def __init__(self, pos, vel, ang, ang_vel, image, info, sound = None, rotations = None, frames = None):
         pygame.sprite.Sprite.__init__(self)
         
+        self.store = None
+        self.pool = None
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.reset(pos, vel, ang, ang_vel, image, info, sound, rotations, frames)
+    
+    def reset(self, pos, vel, ang, ang_vel, image, info, sound = None, rotations = None, frames = None):
+        # pooled sprites are reset rather than created again
         self.pos = [pos[0],pos[1]]
+        self.prev_pos = [pos[0],pos[1]]
         self.vel = [vel[0],vel[1]]
         self.angle = ang
         self.angle_vel = ang_vel
@@ -271,41 +712,97 @@ class Sprite(pygame.sprite.Sprite):
         self.lifespan = info.get_lifespan()
         self.animated = info.get_animated()
         self.age = 0
+        self.rotations = rotations
+        self.frames = frames
+        # what the server calls this sprite in a two player game
+        self.net_id = 0
         if sound:
-            sound.play()
+            voices.play(sound, 'weapons', 1)
         
         self.original_image = self.image = image
-        self.rect = pos_to_rect(self.pos, self.image_size)
+        if self.animated:
+            self.image = self.get_frame()
+        place_rect(self.rect, self.pos, self.image_size)
     
     def update(self):
         self.angle += self.angle_vel
   
+        self.prev_pos = list(self.pos)
         self.pos[0] += self.vel[0]
         self.pos[1] += self.vel[1]
         
         self.pos[0] %= g.width
         self.pos[1] %= g.height
         
+        # age first, the same order EntityStore.step uses
+        self.age += 1
+    
+    def refresh(self, pos = None, angle = None, age = None):
+        # pick the image and rect for the current position before drawing, an EntityGroup
+        # passes pos, angle and age straight from its arrays
+        if pos is None:
+            pos, angle, age = self.pos, self.angle, self.age
         if self.animated:
-            index = (g.time % self.lifespan) // 1
-            self.image = self.original_image.subsurface((index * self.image_size[0], 0), (self.image_size[0], self.image_size[1]))
+            self.image = self.get_frame(age)
         
-        if (self.angle == 0):
-            self.rect = pos_to_rect(self.pos, self.image_size)
+        if (angle == 0):
+            place_rect(self.rect, pos, self.image_size)
+        elif g.backend == 'texture':
+            # turned as it is drawn, see draw_turned()
+            self.image = self.original_image
+            place_rect(self.rect, pos, self.image_size)
+        elif self.rotations and g.rotation_distance and my_ship and dist_sq(pos, my_ship.pos) > g.rotation_distance * g.rotation_distance:
+            # turned down by the quality governor, far away rocks don't turn
+            self.image = self.original_image
+            place_rect(self.rect, pos, self.image_size)
         else:
-            self.image = rotate_around_center(self.original_image, self.angle)
-            w, h = self.image.get_size()
-            self.rect = pos_to_rect(self.pos, (w, h))
-        
-        self.age += 1
+            if self.rotations:
+                self.image = self.rotations.get(angle)
+            else:
+                self.image = rotate_around_center(self.original_image, angle)
+            place_rect(self.rect, pos, self.image.get_size())
+    
+    def get_frame(self, age = None):
+        # the frame for this sprite's age, so every animation starts from its first frame
+        if age is None:
+            age = self.age
+        index = min(int(age), len(self.frames) - 1)
+        return self.frames[index]
     
     def is_old(self):
         return self.age > self.lifespan
     
+    def get_offset(self, alpha, width, height):
+        # where to draw relative to rect, EntityStore.get_offsets does this for stored sprites
+        pos = interpolate(self.prev_pos, self.pos, alpha, width, height)
+        return (int(round(pos[0] - self.pos[0])), int(round(pos[1] - self.pos[1])))
+    
     def collide(self, other):
         rtotal = self.get_radius() + other.get_radius()
-        d = dist(self.get_position(), other.get_position())
-        return d < rtotal
+        if g.collision_squared:
+            hit = dist_sq(self.get_position(), other.get_position()) < rtotal * rtotal
+        else:
+            hit = dist(self.get_position(), other.get_position()) < rtotal
+        return hit and self.touches(other)
+    
+    def touches(self, other):
+        # for a pair whose circles overlap, whether the pixels do too
+        if not g.mask_collisions:
+            return True
+        mask, pos = self.get_mask()
+        other_mask, other_pos = other.get_mask()
+        return mask_tester.overlap(mask, pos, other_mask, other_pos)
+    
+    def get_mask(self):
+        # the mask for the sprite's true angle and its top left corner, whatever is being drawn
+        if self.rotations:
+            mask = self.rotations.get_mask(self.angle)
+        elif self.angle == 0:
+            mask = mask_tester.get_image_mask(self.original_image)
+        else:
+            mask = mask_tester.get_image_mask(self.image)
+        w, h = mask.get_size()
+        return mask, (self.pos[0] - w / 2, self.pos[1] - h / 2)
     
     def get_radius(self):
         return self.radius
@@ -313,7 +810,7 @@ class Sprite(pygame.sprite.Sprite):
     def get_position(self):
         return self.pos
 
-def group_collide(group, s):
+def group_collide(group, s, grid = None, candidates = None):
     rem = []
     
     # this works but there is heaps of empty space within the rects:(
@@ -322,15 +819,39 @@ def group_collide(group, s):
     #for e in rem:
         #explosion_group.add(Sprite(e.get_position(), [0,0], 0, 0, explosion_image, explosion_info))
 
-    for element in group:
-        if element.collide(s):
-            rem.append(element)
-            explosion_group.add(Sprite(element.get_position(), [0,0], 0, 0, explosion_image, explosion_info))
-            explosion_sound.play()
+    if candidates is not None:
+        # group_group_collide() has done the circle test already
+        hits = [element for element in candidates if element.touches(s)]
+    elif group.store is not None:
+        # one circle test over the whole of the group's arrays
+        store = group.store
+        slots = store.get_live()
+        near = circle_overlaps(s.get_position(), [s.get_radius()], store.pos[slots], store.radius[slots], g.collision_squared)[1]
+        hits = [store.sprites[slot] for slot in slots[near].tolist()]
+        hits = [element for element in hits if element.touches(s)]
+    else:
+        # with a grid only the sprites in the cells around s need the exact test
+        if grid is None:
+            candidates = group
+        else:
+            candidates = grid.query(s.get_position())
+        hits = [element for element in candidates if element.collide(s)]
+
+    for element in hits:
+        rem.append(element)
+        if not g.max_explosions or len(explosion_group) < g.max_explosions:
+            explosion = explosion_pool.acquire(element.get_position(), [0,0], 0, 0, explosion_image, explosion_info, None, None, explosion_frames)
+            if explosion:
+                explosion_group.add(explosion)
+        voices.play(explosion_sound, 'explosions', 1)
+        if particles:
+            particles.emit(40, element.get_position(), element.vel, 4, 40, (150, 170, 200))
     
     #group.difference_update(rem)
     for r in rem:
         group.remove(r)
+        if grid is not None:
+            grid.remove(r)
     
     return len(rem)
 
@@ -341,8 +862,26 @@ def group_group_collide(group1, group2):
 
     collisions_total = 0
     rem = []
-    for element in group1:
-        collisions = group_collide(group2, element)
+    if group1.store is not None and group2.store is not None:
+        # every pair of overlapping circles from the arrays at once, then
+        # each element of group1 in turn takes whatever it hit that's left
+        store1, store2 = group1.store, group2.store
+        slots1, slots2 = store1.get_live(), store2.get_live()
+        first, second = circle_overlaps(store1.pos[slots1], store1.radius[slots1], store2.pos[slots2], store2.radius[slots2], g.collision_squared)
+        near = OrderedDict()
+        for i, j in zip(slots1[first].tolist(), slots2[second].tolist()):
+            near.setdefault(store1.sprites[i], []).append(store2.sprites[j])
+        pairs = near.items()
+    else:
+        # bucket group2 once, then each element of group1 only looks at its neighbours
+        collision_grid.rebuild(group2)
+        pairs = [(element, None) for element in group1]
+
+    for element, candidates in pairs:
+        if candidates is None:
+            collisions = group_collide(group2, element, collision_grid)
+        else:
+            collisions = group_collide(group2, element, None, [other for other in candidates if other in group2])
         if collisions > 0:
             rem.append(element)
             collisions_total += collisions
@@ -354,44 +893,66 @@ def group_group_collide(group1, group2):
     return collisions_total
 
 def stop_game():
-    global my_ship
+    global my_ship, other_ship
     
-    pygame.mixer.music.stop()
+    if pygame.mixer.get_init():
+        pygame.mixer.music.stop()
     
     g.playing = False
     g.dead = True
     
     my_ship = None
+    other_ship = None
     
     rock_group.empty()
     missile_group.empty()
     explosion_group.empty()
     
 def new_game():
-    global my_ship
+    global my_ship, other_ship
+    
+    ensure_assets()
     
-    pygame.mixer.music.play()
+    if music_loaded:
+        pygame.mixer.music.play()
     
     g.playing = True
     g.dead = False
     
     g.lives = 1
     g.wave = 0
+    g.winner = 0
+    if rewind_buffer is not None:
+        rewind_buffer.clear()
+    if particles:
+        particles.clear()
     
     ship_size = ship_info.get_size()
-    my_ship = Ship( [(g.width/2)-(ship_size[0]/2), (g.height/2)-(ship_size[1]/2)], [0, 0], 90, ship_image, ship_info)
+    my_ship = Ship( [(g.width/2)-(ship_size[0]/2), (g.height/2)-(ship_size[1]/2)], [0, 0], 90, ship_image, ship_info, ship_rotations)
+    if net_server:
+        other_ship = Ship( [(g.width/2)+(ship_size[0]), (g.height/2)-(ship_size[1]/2)], [0, 0], 90, ship_image, ship_info, ship_rotations)
     
     new_wave()
 
 def new_wave():
     
     g.wave += 1
+    if g.mode == 'stress':
+        # the rocks of earlier waves stay, this one comes all at once
+        count = int(g.stress_first_wave * g.stress_growth ** (g.wave - 1))
+        count = max(0, min(count, g.stress_max_rocks - len(rock_group)))
+        g.wave_rocks_left += count
+        spawn_rocks(count)
+        g.next_wave_time = g.time + g.stress_wave_seconds * g.ticks_per_second
+        voices.play(end_wave_sound, 'ui', 3)
+        return
+
     g.wave_rocks_left = 5 * g.wave
     
     rock_group.empty()
     missile_group.empty()
     
-    end_wave_sound.play()
+    voices.play(end_wave_sound, 'ui', 3)
 
 def click(pos):
     if g.playing:
@@ -411,11 +972,20 @@ def rock_spawner():
     if not g.playing:
         return
     
+    if g.mode == 'stress':
+        if g.time >= g.next_wave_time:
+            # there is no pause between stress waves, so collect just before the next one comes
+            gc_monitor.between_waves()
+            new_wave()
+        return
+    
     if g.betweenwaves:
         # delay for 1 second
         if g.wavedelaystarttime == 0:
-            g.wavedelaystarttime = pygame.time.get_ticks()
-        elif pygame.time.get_ticks() - g.wavedelaystarttime < 1000:
+            g.wavedelaystarttime = g.time
+            # nothing is moving, a good time for the garbage collector
+            gc_monitor.between_waves()
+        elif g.time - g.wavedelaystarttime < g.ticks_per_second:
             return
         else:
             new_wave()
@@ -453,46 +1023,107 @@ def rock_spawner():
     else:
         vel = [rand(minimum, maximum), rand(minimum, maximum)]
     
-    rock = Sprite(pos, vel, angle, angle_vel, asteroid_image, asteroid_info)
+    rock = Sprite(pos, vel, angle, angle_vel, asteroid_image, asteroid_info, None, asteroid_rotations)
     rock_group.add(rock)
 
-def key_down(k):
+def spawn_rocks(count):
+    """add count rocks in one go, along the edges and away from the ship.
+
+    The same rules as rock_spawner(), but with numpy every position is
+    drawn at once and only those too near the ship are drawn again.
+    """
+    if count <= 0:
+        return
+    ship_pos = my_ship.get_position()
+    too_near = my_ship.get_radius() * 4
+    speed = g.wave
+
+    if entities.numpy:
+        numpy = entities.numpy
+        # seeded from random so a recorded game spawns the same rocks
+        rng = numpy.random.RandomState(random.getrandbits(32))
+        pos = numpy.zeros((count, 2))
+        todo = numpy.arange(count)
+        while len(todo):
+            n = len(todo)
+            vertical = rng.randint(0, 2, n) == 0
+            edge = rng.randint(0, 2, n)
+            pos[todo, 0] = numpy.where(vertical, edge * g.width, rng.uniform(0, g.width, n))
+            pos[todo, 1] = numpy.where(vertical, rng.uniform(0, g.height, n), edge * g.height)
+            d = pos[todo] - ship_pos
+            todo = todo[(d * d).sum(1) < too_near * too_near]
+        angles = rng.uniform(-2, 2, count)
+        angle_vels = rng.uniform(-2, 2, count)
+        if g.wave % 2 == 0:
+            vel = (numpy.array(ship_pos) - pos) / (g.width, g.height) * rng.uniform(0, speed, (count, 2))
+        else:
+            vel = rng.uniform(-speed, speed, (count, 2))
+        rocks = zip(pos.tolist(), vel.tolist(), angles.tolist(), angle_vels.tolist())
+    else:
+        rocks = []
+        for i in range(count):
+            pos = None
+            while pos is None or dist(pos, ship_pos) < too_near:
+                if random.choice((0, 1)) == 0:
+                    pos = [random.choice((0, g.width)), rand(0, g.height)]
+                else:
+                    pos = [rand(0, g.width), random.choice((0, g.height))]
+            if g.wave % 2 == 0:
+                vel = [((ship_pos[0] - pos[0]) / g.width) * rand(0, speed), ((ship_pos[1] - pos[1]) / g.height) * rand(0, speed)]
+            else:
+                vel = [rand(-speed, speed), rand(-speed, speed)]
+            rocks.append((pos, vel, rand(-2, 2), rand(-2, 2)))
+
+    rock_group.add(*[Sprite(pos, vel, angle, angle_vel, asteroid_image, asteroid_info, None, asteroid_rotations)
+        for pos, vel, angle, angle_vel in rocks])
+
+def count_entities():
+    return len(rock_group) + len(missile_group) + len(explosion_group)
+
+def key_down(k, ship = None):
     if not g.playing:
         return
+    if ship is None:
+        ship = my_ship
 
     if k == K_LEFT:
-        my_ship.increment_angle_vel()
+        ship.increment_angle_vel()
     elif k == K_RIGHT:
-        my_ship.decrement_angle_vel()
+        ship.decrement_angle_vel()
     elif k == K_UP:
-        my_ship.thrusters(True)
+        ship.thrusters(True)
     elif k == K_SPACE:
-        my_ship.shoot();
+        ship.shoot();
 
-def key_up(k):
+def key_up(k, ship = None):
     if not g.playing:
         return
+    if ship is None:
+        ship = my_ship
 
     if k == K_LEFT:
-        my_ship.decrement_angle_vel()
+        ship.decrement_angle_vel()
     elif k == K_RIGHT:
-        my_ship.increment_angle_vel()
+        ship.increment_angle_vel()
     elif k == K_UP:
-        my_ship.thrusters(False)
+        ship.thrusters(False)
+
+def render_text(font, text):
+    return text_cache.render(font, text, g.text_antialias, g.text_color, g.text_bg_color)
 
 def set_up_splash():
     global splash_surface
 
     splash_surface = pygame.Surface(splash_info.get_size()).convert()
     #splash_surface.blit(splash_image, (0,0))
-    font = pygame.font.SysFont("arial",24)
+    font = get_font("arial",24)
     text = font.render("This is Yet Another Space Shooter", g.text_antialias, g.text_color, g.text_bg_color)
     splash_surface.blit(text, (10, 20))
     
     text = font.render("Prepare to be awe struck...", g.text_antialias, g.text_color, g.text_bg_color)
     splash_surface.blit(text, (10, 80))
     
-    font = pygame.font.SysFont("arial", 18)
+    font = get_font("arial", 18)
     text = font.render("Use the left and right arrows to steer.", g.text_antialias, g.text_color, g.text_bg_color)
     splash_surface.blit(text, (10, 150))
     text = font.render("The up arrow fires your boosters.", g.text_antialias, g.text_color, g.text_bg_color)
@@ -507,48 +1138,549 @@ def set_up_splash():
 def draw_splash(screen):
     splash_size = splash_info.get_size()
     splash_dest_rect = pygame.Rect((g.width/2) - (splash_size[0]/2), (g.height/2) - (splash_size[1]/2), splash_size[0], splash_size[1])
-    screen.blit(splash_surface, splash_dest_rect)
+    return screen.blit(splash_surface, splash_dest_rect)
 
 def draw_end_game_screen(screen):
-    global splash_surface
-
-    surface = pygame.Surface(splash_info.get_size()).convert()
-    font = pygame.font.SysFont("arial",24)
-    text = font.render("You survived "+str(g.wave - 1)+" waves", g.text_antialias, g.text_color, g.text_bg_color)
-    surface.blit(text, (10, 20))
-    
-    text = font.render("Click here to try again", g.text_antialias, g.text_color, g.text_bg_color)
-    surface.blit(text, (10, 80))
+    global end_game_surface, end_game_key
+
+    # only the number of waves survived and who won change so rebuild when they do
+    if end_game_key != (g.wave, g.winner):
+        end_game_key = (g.wave, g.winner)
+        end_game_surface = pygame.Surface(splash_info.get_size()).convert()
+        font = get_font("arial",24)
+        if g.winner:
+            text = render_text(font, "Player "+str(g.winner)+" wins after "+str(g.wave - 1)+" waves")
+        else:
+            text = render_text(font, "You survived "+str(g.wave - 1)+" waves")
+        end_game_surface.blit(text, (10, 20))
+        
+        text = render_text(font, "Click here to try again")
+        end_game_surface.blit(text, (10, 80))
 
     splash_size = splash_info.get_size()
     dest_rect = pygame.Rect((g.width/2) - (splash_size[0]/2), (g.height/2) - (splash_size[1]/2), splash_size[0], splash_size[1])
-    screen.blit(surface, dest_rect)
+    return screen.blit(end_game_surface, dest_rect)
+
+def step(actions = ()):
+    """advance the game by one tick.
+
+    actions are (name, value) pairs: ('key_down', key), ('key_up', key) or ('click', pos)
+    """
+    begin_tick(actions)
 
-def main():
+    if not g.playing:
+        return
 
-    font = pygame.font.SysFont("arial",16)
+    update_sprites()
+    handle_collisions()
+
+def begin_tick(actions):
+    g.time += 1
+    apply_actions(actions)
+
+    # the rock spawner runs once a second
+    if g.time % g.ticks_per_second == 0:
+        rock_spawner()
+
+def apply_actions(actions, ship = None):
+    for name, value in actions:
+        if name == 'key_down':
+            key_down(value, ship)
+        elif name == 'key_up':
+            key_up(value, ship)
+        elif name == 'click':
+            click(value)
+
+def update_sprites():
+    missile_group.update()
+    rock_group.update()
+    explosion_group.update()
+    
+    if my_ship:
+        my_ship.update()
+    if other_ship:
+        other_ship.update()
+    profiler.mark('update')
     
-    bg = pygame.Surface(screen.get_size()).convert()
-    bg.blit(nebula_image, screen.get_rect(), nebula_image.get_rect())
+    # remove old missiles
+    missile_group.remove_old()
+    
+    #remove completed explosions
+    explosion_group.remove_old()
+    profiler.mark('prune')
+
+def handle_collisions():
+    # in a two player game the first ship hit loses
+    if other_ship and group_collide(rock_group, other_ship) > 0 and g.mode == 'normal':
+        g.winner = 1
+        stop_game()
+        profiler.mark('ship_collide')
+        return
+    if group_collide(rock_group, my_ship) > 0 and g.mode == 'normal':
+        g.lives -= 1
+        if other_ship:
+            g.winner = 2
+            g.lives = 0
+        if g.lives == 0:
+            stop_game()
+            profiler.mark('ship_collide')
+            return
+    profiler.mark('ship_collide')
+    
+    g.wave_rocks_left -= group_group_collide(rock_group, missile_group)
+    profiler.mark('rock_collide')
+    if (not g.betweenwaves and g.wave_rocks_left <= 0):
+        g.betweenwaves = True
+
+def set_quality(level):
+    """apply one of g.quality_levels, 0 being full quality."""
+    global scaled_target
+    buckets, g.rotation_distance, g.max_explosions, g.hud_interval, g.render_scale = g.quality_levels[level]
+    if asteroid_rotations.buckets != buckets:
+        asteroid_rotations.set_buckets(buckets)
+    # the texture backend always draws at full size
+    if g.render_scale > 1 and g.backend == 'surface':
+        scaled_target = ScaledTarget(screen, g.render_scale)
+    else:
+        scaled_target = None
+    renderer.invalidate()
+
+def draw_turned(group, target, alpha):
+    # the texture backend turns each sprite as it draws it
+    sprites = group.sprites()
+    if alpha < 1.0:
+        rects = group.get_draw_rects(sprites, alpha)
+    else:
+        rects = [sprite.rect for sprite in sprites]
+    return [target.draw_rotated(sprite.image, rect.center, sprite.angle) for sprite, rect in zip(sprites, rects)]
+
+def draw(screen, alpha = 1.0):
+    global hud_text, hud_age
+    # alpha is how far the frame is from the last tick to the next, the
+    # sprites are drawn that far between where they were and where they are
+    # the splash and game over screens only change with the wave reached
+    if g.playing:
+        static_key = None
+    else:
+        static_key = (g.dead, g.wave)
+
+    if not renderer.begin(screen, static_key):
+        profiler.mark('draw')
+        return
+
+    if not g.playing and not g.dead:
+        renderer.add(draw_splash(screen), True)
+        profiler.mark('draw')
+    elif g.dead:
+        renderer.add(draw_end_game_screen(screen), True)
+        profiler.mark('draw')
+    else:
+        # at low quality everything is drawn small and stretched over the screen
+        target = screen
+        if scaled_target:
+            target = scaled_target
+            renderer.invalidate()
+            target.blit(background, (0, 0))
+
+        if my_ship:
+            renderer.add(my_ship.draw(target, alpha))
+        if other_ship:
+            renderer.add(other_ship.draw(target, alpha))
+        profiler.mark('draw')
+
+        hud_age += 1
+        if hud_text is None or hud_age >= g.hud_interval:
+            hud_text = render_text(hud_font, "Wave "+str(g.wave)+"  rocks left "+str(g.wave_rocks_left))
+            hud_age = 0
+        renderer.add(target.blit(hud_text,(640, 80)))
+        profiler.mark('hud')
+
+        # however many ticks ran, the images and rects only need to catch up once
+        refresh_sprites()
+        for group in (missile_group, rock_group, explosion_group):
+            if g.backend == 'texture':
+                renderer.add(draw_turned(group, target, alpha))
+            else:
+                renderer.add(group.draw(target, alpha))
+        profiler.mark('sprites')
+
+        if particles:
+            if scaled_target:
+                particles.draw(scaled_target.canvas, g.render_scale)
+            else:
+                renderer.add(particles.draw(target))
+            profiler.mark('particles')
+        if scaled_target:
+            renderer.add(scaled_target.present())
+            profiler.mark('sprites')
+
+def state_checksum():
+    # sprites are sorted so only the game state matters, not the order of the groups.
+    # Explosions are left out, the quality governor may cut them short
+    values = [g.time, g.wave, g.wave_rocks_left, g.lives, g.playing, g.dead, g.betweenwaves]
+    if my_ship:
+        # the angle is a float once restored from a snapshot, whatever it was before
+        values += [round(v, 4) for v in list(my_ship.pos) + list(my_ship.vel)] + [float(my_ship.angle)]
+    for group in (rock_group, missile_group):
+        values.append(len(group))
+        values += sorted([(round(s.pos[0], 4), round(s.pos[1], 4)) for s in group])
+    return zlib.crc32(repr(values)) & 0xffffffff
+
+def take_snapshot():
+    """the whole game state packed into a string, see restore_snapshot()."""
+    header = (g.time, g.wave, g.wave_rocks_left, g.lives, g.playing, g.dead, g.betweenwaves,
+        g.wavedelaystarttime, g.next_wave_time, MODES.index(g.mode))
+    ship = None
+    if my_ship:
+        ship = tuple(my_ship.pos) + tuple(my_ship.prev_pos) + tuple(my_ship.vel) + (my_ship.angle, my_ship.angle_vel, my_ship.thrust)
+    groups = [group.get_state() for group in (rock_group, missile_group, explosion_group)]
+    return snapshot.pack(header, ship, random.getstate(), groups)
+
+def restore_snapshot(data, keep_input = False):
+    """put the game back as it was when take_snapshot() returned data.
+
+    With keep_input the ship keeps turning and thrusting as the keys held
+    now say, rather than as they were held then. The sprites' images are
+    picked again when they are next drawn.
+    """
+    global my_ship, hud_text
+
+    ensure_assets()
+    header, ship, random_state, groups = snapshot.unpack(data, entities.STATE_VALUES)
+    (g.time, g.wave, g.wave_rocks_left, g.lives, playing, dead, betweenwaves,
+        g.wavedelaystarttime, g.next_wave_time, mode) = header
+    g.mode = MODES[mode]
+    g.playing, g.dead, g.betweenwaves = bool(playing), bool(dead), bool(betweenwaves)
+    random.setstate(random_state)
+
+    if ship is None:
+        my_ship = None
+        ship_thrust_sound.stop()
+    else:
+        if my_ship is None:
+            keep_input = False
+            my_ship = Ship(ship[0:2], ship[4:6], ship[6], ship_image, ship_info, ship_rotations)
+        my_ship.pos = list(ship[0:2])
+        my_ship.prev_pos = list(ship[2:4])
+        my_ship.vel = list(ship[4:6])
+        my_ship.angle = ship[6]
+        if not keep_input:
+            my_ship.angle_vel = ship[7]
+            my_ship.thrust = bool(ship[8])
+            if not my_ship.thrust:
+                ship_thrust_sound.stop()
+        place_rect(my_ship.rect, my_ship.pos, my_ship.image_size)
+
+    makers = (
+        lambda: Sprite([0, 0], [0, 0], 0, 0, asteroid_image, asteroid_info, None, asteroid_rotations),
+        lambda: missile_pool.acquire([0, 0], [0, 0], 0, 0, missile_image, missile_info),
+        lambda: explosion_pool.acquire([0, 0], [0, 0], 0, 0, explosion_image, explosion_info, None, None, explosion_frames),
+    )
+    for group, make, state in zip((rock_group, missile_group, explosion_group), makers, groups):
+        group.set_state(make, *state)
+
+    hud_text = None
+    if renderer:
+        renderer.invalidate()
+    # back from the game over screen
+    if g.playing and music_loaded and not pygame.mixer.music.get_busy():
+        pygame.mixer.music.play()
+
+def get_net_entities():
+    """every ship and sprite as a quantized record, by id.
+
+    The server's ship is 1 and the client's 2, sprites are numbered as they are first sent.
+    """
+    global next_net_id
+    table = {}
+    for id, ship in ((1, my_ship), (2, other_ship)):
+        if ship:
+            table[id] = net.quantize(net.SHIP, ship.pos, ship.vel, ship.angle, ship.angle_vel, ship.thrust)
+    sprites = [(kind, sprite) for kind, group in ((net.ROCK, rock_group), (net.MISSILE, missile_group), (net.EXPLOSION, explosion_group))
+        for sprite in group]
+    used = set([sprite.net_id for kind, sprite in sprites if sprite.net_id])
+    for kind, sprite in sprites:
+        if not sprite.net_id:
+            sprite.net_id = next_net_id = net.next_free_id(next_net_id, used)
+            used.add(sprite.net_id)
+        frame = 0
+        if kind == net.EXPLOSION:
+            frame = sprite.age
+        table[sprite.net_id] = net.quantize(kind, sprite.pos, sprite.vel, sprite.angle, sprite.angle_vel, frame)
+    return table
+
+def send_net_state():
+    flags = 0
+    if g.playing:
+        flags |= net.PLAYING
+    if g.dead:
+        flags |= net.DEAD
+    if g.betweenwaves:
+        flags |= net.BETWEEN_WAVES
+    net_server.send(g.time, g.wave, g.wave_rocks_left, flags, g.winner, get_net_entities())
+
+def steer(ship, actions, quiet = False):
+    # the turning and thrusting part of key_down() and key_up(), the
+    # client predicts its own ship with it, only the server fires
+    for name, value in actions:
+        if name == 'key_down':
+            change = 1
+        elif name == 'key_up':
+            change = -1
+        else:
+            continue
+        if value == K_LEFT:
+            ship.angle_vel += change * g.ship_turn_speed
+        elif value == K_RIGHT:
+            ship.angle_vel -= change * g.ship_turn_speed
+        elif value == K_UP:
+            if quiet:
+                ship.thrust = change > 0
+            else:
+                ship.thrusters(change > 0)
+
+def set_net_ship(ship, record):
+    # a ship as the server last saw it, made if it is new
+    kind, pos, vel, angle, angle_vel, thrust = net.dequantize(record)
+    if ship is None:
+        ship = Ship(pos, vel, angle, ship_image, ship_info, ship_rotations)
+    ship.prev_pos = list(ship.pos)
+    ship.pos = pos
+    ship.vel = vel
+    ship.angle = angle
+    ship.angle_vel = angle_vel
+    ship.thrust = bool(thrust)
+    place_rect(ship.rect, ship.pos, ship.image_size)
+    return ship
+
+def apply_net_state(header, table):
+    """take on the state the server sent, then replay the input it hasn't seen on our ship."""
+    global my_ship, other_ship
+
+    ensure_assets()
+    tick, base_tick, last_input, g.wave, g.wave_rocks_left, flags, g.winner = header
+    playing = bool(flags & net.PLAYING)
+    if music_loaded and playing != g.playing:
+        if playing:
+            pygame.mixer.music.play()
+        else:
+            pygame.mixer.music.stop()
+    g.playing = playing
+    g.dead = bool(flags & net.DEAD)
+    g.betweenwaves = bool(flags & net.BETWEEN_WAVES)
+
+    if 1 in table:
+        other_ship = set_net_ship(other_ship, table[1])
+    else:
+        other_ship = None
+    if 2 in table:
+        predicted = my_ship and list(my_ship.pos)
+        my_ship = set_net_ship(my_ship, table[2])
+        for actions in net_client.get_pending():
+            steer(my_ship, actions, True)
+            # the trail was drawn when these ticks were first predicted
+            my_ship.update(True)
+        if predicted:
+            net_client.add_correction(dist(predicted, my_ship.pos))
+    elif my_ship:
+        ship_thrust_sound.stop()
+        my_ship = None
+
+    groups = {net.ROCK: rock_group, net.MISSILE: missile_group, net.EXPLOSION: explosion_group}
+    for id in [id for id in net_sprites if id not in table or table[id][0] != net_sprites[id][0]]:
+        kind, sprite = net_sprites.pop(id)
+        groups[kind].remove(sprite)
+    for id, record in table.iteritems():
+        kind, pos, vel, angle, angle_vel, frame = net.dequantize(record)
+        if kind == net.SHIP:
+            continue
+        if id in net_sprites:
+            sprite = net_sprites[id][1]
+            sprite.pos = pos
+            sprite.vel = vel
+            sprite.angle = angle
+            sprite.angle_vel = angle_vel
+            if kind == net.EXPLOSION:
+                sprite.age = frame
+            continue
+        if kind == net.ROCK:
+            sprite = Sprite(pos, vel, angle, angle_vel, asteroid_image, asteroid_info, None, asteroid_rotations)
+        elif kind == net.MISSILE:
+            sprite = missile_pool.acquire(pos, vel, angle, angle_vel, missile_image, missile_info, missile_sound)
+        else:
+            sprite = explosion_pool.acquire(pos, vel, angle, angle_vel, explosion_image, explosion_info, None, None, explosion_frames)
+            if sprite:
+                sprite.age = frame
+                voices.play(explosion_sound, 'explosions', 1)
+                if particles:
+                    particles.emit(40, pos, (0, 0), 4, 40, (150, 170, 200))
+        if sprite:
+            groups[kind].add(sprite)
+            net_sprites[id] = (kind, sprite)
+
+def client_step(actions):
+    """a tick of a client: take on the server's newest state and carry it on a tick.
+
+    Our own ship follows the keys at once rather than waiting for the server.
+    """
+    g.time += 1
+    state = net_client.receive()
+    if state:
+        apply_net_state(*state)
+    if my_ship:
+        steer(my_ship, actions)
+    net_client.send_input(actions)
+
+    # sprites leave when the server says so, not when they get old
+    for group in (missile_group, rock_group, explosion_group):
+        group.update()
+    for ship in (my_ship, other_ship):
+        if ship:
+            ship.update()
+
+def run_net_headless(ticks):
+    """play ticks ticks of a two player game without a display, at the normal speed."""
+    init_headless()
+    actions = autopilot(True)
+    tick_length = 1.0 / g.ticks_per_second
+    next_tick = time.time()
+    for tick in range(ticks):
+        if net_client:
+            client_step(next(actions))
+        else:
+            for remote in net_server.receive():
+                apply_actions(remote, other_ship)
+            step(next(actions))
+            send_net_state()
+        next_tick += tick_length
+        time.sleep(max(0, next_tick - time.time()))
+
+def refresh_sprites():
+    for group in (rock_group, missile_group, explosion_group):
+        group.refresh()
+
+def replay(recorded, realtime = False):
+    """play a recording back, checking every tick against its checksum.
+
+    Returns the first tick that turned out differently, or None if they all matched.
+    """
+    if realtime:
+        init_display()
+        set_up_splash()
+        clock = pygame.time.Clock()
+    else:
+        init_headless()
+    # the game is played as it was recorded, whatever --stress says
+    g.mode = MODES[recorded.mode]
+    random.seed(recorded.seed)
+
+    for tick, actions in enumerate(recorded.get_actions()):
+        step(actions)
+        if state_checksum() != recorded.checksums[tick]:
+            return tick
+        if realtime:
+            pygame.event.pump()
+            draw(canvas)
+            renderer.present()
+            clock.tick(g.ticks_per_second)
+    return None
+
+def autopilot(wander = False):
+    """an endless action stream that spins, fires and starts a new game after dying.
+
+    With wander it also lets go, thrusts and turns the other way now and again.
+    """
+    center = (g.width / 2, g.height / 2)
+    tick = 0
+    while 1:
+        actions = []
+        if not g.playing:
+            actions.append(('click', center))
+            actions.append(('key_down', K_LEFT))
+        elif tick % 5 == 0:
+            actions.append(('key_down', K_SPACE))
+        if wander and g.playing and tick % 90 == 0:
+            key = (K_LEFT, K_UP, K_RIGHT)[tick / 90 % 3]
+            actions.append(('key_down', key))
+        elif wander and g.playing and tick % 90 == 45:
+            key = (K_LEFT, K_UP, K_RIGHT)[tick / 90 % 3]
+            actions.append(('key_up', key))
+        tick += 1
+        yield actions
+
+def run_headless(ticks, actions = None):
+    """step the game ticks times as fast as possible and return the ticks per second.
+
+    actions gives the list of actions for each tick, once it runs out no more input is sent.
+    """
+    if actions is None:
+        actions = []
+    actions = iter(actions)
+
+    start = time.time()
+    for tick in range(ticks):
+        profiler.begin_frame()
+        step(next(actions, ()))
+        gc_monitor.end_frame()
+        profiler.mark('gc')
+        profiler.end_frame(g.wave, governor.level, count_entities())
+    elapsed = time.time() - start
+
+    if elapsed == 0:
+        return float('inf')
+    return ticks / elapsed
+
+def main(resume = None):
+    global rewind_buffer
+
+    init_display()
+    if rewind_buffer is None:
+        rewind_buffer = snapshot.RewindBuffer(g.rewind_memory)
     
     set_up_splash()
+    if resume:
+        restore_snapshot(resume)
     #stop_game()
     
     clock = pygame.time.Clock()
-    
-    # set up the rock spawner
-    pygame.time.set_timer(USEREVENT + 1, 1000)
+
+    profiler.enabled = True
+    overlay_font = get_font("courier", 12)
+    overlay_lines = []
+    overlay_age = g.overlay_interval
+    target = g.target_frame_rate
+    if g.frame_rate:
+        target = min(target, g.frame_rate)
+    budget = 1.0 / target
+    governor.budget = budget
+    governor.enabled = g.governor
+    quality = 0
+    tick_length = 1.0 / g.ticks_per_second
+    # real time not yet simulated, and input waiting for the next tick
+    accumulator = 0.0
+    actions = []
+    # while backspace is held the game runs backwards a tick at a time
+    rewinding = False
+    if g.fast_input:
+        filter_events()
 
     while 1:
-        clock.tick(60)
-        g.time += 1
+        profiler.begin_frame()
+        if g.pacing == 'busy':
+            clock.tick_busy_loop(g.frame_rate)
+        else:
+            clock.tick(g.frame_rate)
+        accumulator += clock.get_time() / 1000.0
+        profiler.mark('idle')
 
         #Handle Input Events
-        for event in pygame.event.get():
+        # polled as late as possible, just before the tick that will use it
+        events = ()
+        if not g.fast_input or accumulator >= tick_length:
+            events = input_monitor.poll()
+        for event in events:
             if event.type == QUIT:
                 return
-            elif event.type == USEREVENT + 1:
-                rock_spawner()
             elif event.type == KEYDOWN:
                 #if not playing:
                     #new_game()
@@ -556,58 +1688,263 @@ def main():
 
                 if event.key == K_ESCAPE:
                     return
+                elif event.key == K_F3:
+                    g.show_profiler = not g.show_profiler
+                elif event.key == K_BACKSPACE:
+                    rewinding = True
+                elif event.key in (K_F5, K_F9) and (net_server or net_client):
+                    print 'Games played over the network cannot be saved or loaded'
+                elif event.key == K_F9 and recorder:
+                    # a recording starts from its seed, it can't jump to a saved game
+                    print 'A saved game cannot be loaded while recording'
+                elif event.key == K_F5:
+                    snapshot.save(g.save_file, take_snapshot())
+                    print 'Saved the game to', g.save_file
+                elif event.key == K_F9:
+                    try:
+                        restore_snapshot(snapshot.load(g.save_file))
+                    except (EnvironmentError, ValueError), message:
+                        print 'Cannot load the saved game:', message
                 else:
-                    key_down(event.key)
+                    actions.append(('key_down', event.key))
             elif event.type == KEYUP:
-                key_up(event.key)
+                if event.key == K_BACKSPACE:
+                    rewinding = False
+                else:
+                    actions.append(('key_up', event.key))
             elif event.type == MOUSEBUTTONDOWN:
-                click(event.pos)
+                actions.append(('click', event.pos))
        
         #sprites_clicked = [sprite for sprite in all_my_sprites_list if sprite.rect.collidepoint(x, y)]
 
-        screen.blit(bg, (0, 0))
-
-        if not g.playing and not g.dead:
-            draw_splash(screen)
-        elif g.dead:
-            draw_end_game_screen(screen)
+        profiler.mark('events')
+
+        # run as many fixed ticks as real time calls for; when that falls
+        # behind frames are drawn less often first, and past
+        # max_catch_up_ticks the game slows down rather than stalling
+        ticks = 0
+        while accumulator >= tick_length and ticks < g.max_catch_up_ticks:
+            if net_client:
+                client_step(actions)
+            # a recording or another player can't follow the game backwards
+            elif rewinding and not recorder and not net_server and not len(rewind_buffer):
+                # back at the oldest snapshot kept the game holds still, and
+                # input waits, until backspace is let go
+                accumulator %= tick_length
+                break
+            elif rewinding and not recorder and not net_server:
+                restore_snapshot(rewind_buffer.pop(), True)
+                apply_actions(actions)
+                profiler.mark('snapshot')
+            else:
+                if net_server:
+                    for remote in net_server.receive():
+                        apply_actions(remote, other_ship)
+                step(actions)
+                if recorder:
+                    recorder.record(actions, state_checksum())
+                elif net_server:
+                    send_net_state()
+                elif g.playing and g.mode == 'normal':
+                    rewind_buffer.push(g.time, take_snapshot())
+                profiler.mark('snapshot')
+            actions = []
+            accumulator -= tick_length
+            ticks += 1
+        if ticks:
+            input_monitor.ticked()
+        voices.end_frame()
+        if ticks == g.max_catch_up_ticks:
+            accumulator = min(accumulator, tick_length)
+
+        # particles only look the part, they move with the frame not the tick
+        if particles:
+            particles.step(clock.get_time() / 1000.0 * g.ticks_per_second)
+            profiler.mark('particles')
+
+        draw(canvas, accumulator / tick_length)
+
+        if g.show_profiler and overlay_age >= g.overlay_interval:
+            overlay_age = 0
+            lines = overlay_lines = ["wave %d, %d entities" % (g.wave, count_entities()), "quality " + governor.report()]
+            lines.append("audio " + voices.report())
+            lines.append("rewind " + rewind_buffer.report(g.ticks_per_second))
+            if input_monitor.enabled:
+                lines.append("input " + input_monitor.report())
+            if particles:
+                lines.append("particles " + particles.report())
+            if net_server or net_client:
+                lines.append("net " + (net_server or net_client).report(g.ticks_per_second))
+            if gc_monitor.policy != 'auto':
+                lines.append("gc " + gc_monitor.report())
+            if g.startup_time is not None:
+                lines.append("startup %.0f ms" % (g.startup_time * 1000))
+            if missile_pool:
+                lines += ["missiles " + missile_pool.report(), "explosions " + explosion_pool.report()]
+        if g.show_profiler:
+            overlay_age += 1
+            renderer.add(draw_overlay(canvas, profiler, overlay_font, budget, overlay_lines, overlay_text_cache))
+            profiler.mark('overlay')
+
+        renderer.present()
+        input_monitor.flipped()
+        profiler.mark('flip')
+        gc_monitor.end_frame()
+        profiler.mark('gc')
+        profiler.end_frame(g.wave, governor.level, count_entities())
+
+        # only frames of the game itself say anything about the load
+        if g.playing:
+            governor.update(profiler.get_busy_time(profiler.get_slots(1)[0]))
+            if governor.level != quality:
+                quality = governor.level
+                set_quality(quality)
+
+        if g.startup_time is None:
+            g.startup_time = time.time() - launch_time
+            if g.stats:
+                print 'First splash frame after %.0f ms' % (g.startup_time * 1000)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Yet Another Space Shooter')
+    parser.add_argument('--headless', type=int, metavar='TICKS',
+        help='run TICKS ticks of the simulation without a display, as fast as possible, and report ticks per second')
+    parser.add_argument('--seed', type=int, help='seed the random number generator')
+    parser.add_argument('--record', metavar='FILE', help='record the random seed and every input to FILE')
+    parser.add_argument('--replay', metavar='FILE',
+        help='replay a recording without a display, as fast as possible, checking every tick plays out the same')
+    parser.add_argument('--realtime', action='store_true', help='show the replay in a window at normal speed')
+    parser.add_argument('--render', choices=('flip', 'dirty'), default=g.render_mode,
+        help='redraw the whole screen every frame or only the parts that changed')
+    parser.add_argument('--fps', type=int, default=g.frame_rate,
+        help='frames drawn a second, 0 for as many as possible; the game itself always runs %d ticks a second' % g.ticks_per_second)
+    parser.add_argument('--target-fps', type=int, default=g.target_frame_rate,
+        help='frames a second the quality is lowered to keep up, or --fps if that is lower')
+    parser.add_argument('--quality', type=int, choices=range(len(g.quality_levels)),
+        help='play at this quality level, 0 being the best, instead of adjusting it to keep up')
+    parser.add_argument('--backend', choices=('surface', 'texture', 'texture-software'), default=g.backend,
+        help="draw by blitting surfaces, or with textures through SDL's renderer (needs pygame 2), optionally its software one")
+    parser.add_argument('--gc', choices=POLICIES, default='auto',
+        help="when the garbage collector runs: 'auto' leaves it to Python, 'frame' runs it at the end of frames, "
+            "'waves' between waves; all but 'auto' report collection pauses and allocations on exit")
+    parser.add_argument('--stress', action='store_true',
+        help='endless waves growing by %gx every %d seconds and a ship that cannot die, then report frame time against entity count'
+            % (g.stress_growth, g.stress_wave_seconds))
+    parser.add_argument('--audio-buffer', type=int, default=g.mixer_buffer,
+        help='mixer buffer in samples, smaller plays sounds sooner but may crackle')
+    parser.add_argument('--audio-frequency', type=int, default=g.mixer_frequency, help='mixer frequency in Hz')
+    parser.add_argument('--resume', metavar='FILE', help='carry on from a game saved with F5 (not with --record)')
+    parser.add_argument('--serve', type=int, nargs='?', const=g.net_port, metavar='PORT',
+        help='host a two player game on UDP port PORT (default %d), the other player joins with --connect' % g.net_port)
+    parser.add_argument('--connect', metavar='HOST[:PORT]',
+        help='join a two player game; with --headless TICKS either end plays by itself at normal speed, for testing over loopback')
+    parser.add_argument('--overlay', action='store_true', help='start with the frame timing overlay showing (toggle with F3)')
+    parser.add_argument('--pacing', choices=PACING, default=g.pacing,
+        help="keep the frame rate by sleeping ('tick') or by spinning through the end of each frame ('busy')")
+    parser.add_argument('--fast-input', action='store_true',
+        help='filter out events the game ignores and only poll for input in frames that run a tick')
+    parser.add_argument('--input-latency', action='store_true', help='time input from the event queue to the screen')
+    parser.add_argument('--stats', action='store_true',
+        help='report startup time and the caches, pools, audio, particles and network on exit')
+    parser.add_argument('--trace', metavar='FILE', help='on exit write the recorded frame timings to FILE as a Chrome trace')
+    args = parser.parse_args()
+    if args.record and args.resume:
+        # a recording is replayed from its random seed, not from a saved game
+        parser.error('--record cannot be used with --resume')
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    g.show_profiler = args.overlay
+    g.stats = args.stats
+    g.render_mode = args.render
+    g.frame_rate = args.fps
+    g.target_frame_rate = max(1, args.target_fps)
+    g.pacing = args.pacing
+    g.fast_input = args.fast_input
+    input_monitor.enabled = args.input_latency
+    g.mixer_buffer = args.audio_buffer
+    g.mixer_frequency = args.audio_frequency
+    if args.stress:
+        g.mode = 'stress'
+        profiler.enabled = True
+    gc_monitor.set_policy(args.gc)
+    if args.gc != 'auto':
+        profiler.counter = gc_monitor.get_allocated
+    g.backend = args.backend
+    if args.backend == 'texture-software':
+        g.backend = 'texture'
+        g.texture_accelerated = 0
+
+    if args.serve:
+        net_server = net.NetServer(args.serve, g.width, g.height)
+    elif args.connect:
+        host, port = (args.connect.split(':') + [g.net_port])[:2]
+        net_client = net.NetClient((host, int(port)), g.width, g.height)
+
+    if args.replay:
+        recorded = recording.load(args.replay)
+        start = time.time()
+        diverged = replay(recorded, args.realtime)
+        elapsed = max(time.time() - start, 0.000001)
+        print 'Replayed %d ticks at %.0f ticks/second' % (recorded.ticks, recorded.ticks / elapsed)
+        if diverged is None:
+            print 'Every tick matched the recording'
         else:
-            
-            missile_group.update()
-            rock_group.update()
-            explosion_group.update()
-            
-            # remove old missiles
-            old_missiles = [m for m in missile_group if m.is_old()]
-            for m in old_missiles:
-                missile_group.remove(m)
-            
-            #remove completed explosions
-            old_explosions = [e for e in explosion_group if e.is_old()]
-            for e in old_explosions:
-                explosion_group.remove(e)
-            
-            if my_ship:
-                my_ship.update()
-                my_ship.draw()
-
-            if group_collide(rock_group, my_ship) > 0:
-                g.lives -= 1
-                if g.lives == 0:
-                    stop_game()
-            
-            g.wave_rocks_left -= group_group_collide(rock_group, missile_group)
-            if (not g.betweenwaves and g.wave_rocks_left <= 0):
-                g.betweenwaves = True
-            
-            text=font.render("Wave "+str(g.wave)+"  rocks left "+str(g.wave_rocks_left), g.text_antialias, g.text_color, g.text_bg_color)
-            screen.blit(text,(640, 80))
-
-            missile_group.draw(screen)
-            rock_group.draw(screen)
-            explosion_group.draw(screen)
-
-        pygame.display.flip()
-
-if __name__ == '__main__': main()
-
+            print 'The game diverged from the recording at tick %d' % diverged
+    elif args.headless and (net_server or net_client):
+        run_net_headless(args.headless)
+    elif args.headless:
+        init_headless()
+        rate = run_headless(args.headless, autopilot())
+        print '%d ticks, %.0f ticks/second, reached wave %d' % (args.headless, rate, g.wave)
+    else:
+        if args.record:
+            seed = args.seed
+            if seed is None:
+                seed = random.randint(0, 0xffffffff)
+            random.seed(seed)
+            recorder = recording.Recording(seed, MODES.index(g.mode))
+        if args.quality is not None:
+            g.governor = False
+            governor.set_level(args.quality)
+        resume = None
+        if args.resume:
+            resume = snapshot.load(args.resume)
+            g.save_file = args.resume
+        main(resume)
+        if args.record:
+            recorder.save(args.record)
+        if args.trace:
+            profiler.write_trace(args.trace)
+    if g.stats:
+        ensure_assets()
+        print 'Asteroid rotation cache:', asteroid_rotations.report()
+        print 'Ship rotations:', ship_rotations.report()
+        print 'Text cache:', text_cache.report()
+        if g.backend == 'texture':
+            print 'Textures:', renderer.report()
+        print 'Collision masks:', mask_tester.report()
+        if missile_pool:
+            print 'Missile pool:', missile_pool.report()
+            print 'Explosion pool:', explosion_pool.report()
+        if asset_pack:
+            print 'Asset pack:', asset_pack.report()
+        print 'Audio:', voices.report()
+        if particles:
+            print 'Particles:', particles.report()
+        if rewind_buffer is not None and rewind_buffer.pushed:
+            print 'Rewind buffer:', rewind_buffer.report(g.ticks_per_second)
+        if net_server or net_client:
+            print 'Network:', (net_server or net_client).report(g.ticks_per_second)
+    if input_monitor.enabled:
+        print 'Input:', input_monitor.report()
+    if g.mode == 'stress':
+        print 'Entities  frames  average ms  p95 ms'
+        for low, frames, average, p95 in profiler.get_scaling():
+            print '%8d  %6d  %10.2f  %6.2f' % (low, frames, average * 1000, p95 * 1000)
+    if gc_monitor.policy != 'auto':
+        print 'Garbage collection:', gc_monitor.report()
+        if profiler.frames:
+            # a phase that freed more than it made counts as none
+            print '%s a frame:' % gc_monitor.get_allocation_name().capitalize(), ', '.join(['%s %.0f' % (phase,
+                max(0.0, profiler.get_average_allocations(phase, profiler.capacity))) for phase in PHASES])
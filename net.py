@@ -0,0 +1,441 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+# Two player games over UDP. The server runs the game, clients only send
+# their key presses and clicks. Each tick the server sends back what
+# changed since the last state the client said it had: every entity is a
+# record of small integers, see quantize(), and a field is only sent when
+# it is further from what the client will predict than its tolerance.
+
+import socket, struct, zlib
+from collections import deque
+from timeit import default_timer as timer
+
+from recording import ACTIONS
+from profiler import percentile
+
+INPUT = 1
+STATE = 2
+
+# type, newest input, last server tick received, checksum of that tick's entities, inputs that follow
+INPUT_HEADER = struct.Struct('<BIIIB')
+# input number, actions that follow
+INPUT_ENTRY = struct.Struct('<IB')
+# action, key or click x, click y
+ACTION = struct.Struct('<Bhh')
+
+# type, tick, baseline tick (0 for none), last input applied, wave, rocks left, flags, winner, removed, changed
+STATE_HEADER = struct.Struct('<BIIIHhBBHH')
+PLAYING = 1
+DEAD = 2
+BETWEEN_WAVES = 4
+
+# the kinds of entity, 0 is a ship
+SHIP, ROCK, MISSILE, EXPLOSION = range(4)
+
+# entity records are (kind, x, y, vx, vy, angle, angle_vel, frame) where
+# frame is an explosion's age and whether a ship is thrusting
+FIELD_FORMATS = 'BHHhhHhB'
+POS_SCALE = 8
+VEL_SCALE = 64
+ANGLE_SCALE = 65536 / 360.0
+SPIN_SCALE = 100
+# a field the client predicts this close is not sent: an eighth of a pixel per unit, 1/65536 of a turn
+TOLERANCES = (0, 8, 8, 0, 0, 182, 0, 0)
+ALL_FIELDS = 0xff
+
+ENTITY_HEADER = struct.Struct('<HB')
+entity_structs = {}
+
+# 1 and 2 are the ships, sprites take the rest and go round again after 65535
+FIRST_ID = 3
+LAST_ID = 65535
+
+# well under the 65507 bytes a UDP datagram can carry, changes that don't
+# fit are sent in the ticks after
+MAX_STATE_SIZE = 16384
+# inputs a client keeps, and sends again in every packet, while the server
+# hasn't applied them; the count in INPUT_HEADER is a byte
+MAX_PENDING = 120
+
+def get_entity_struct(mask):
+    # the fields a mask says are present, in order
+    packer = entity_structs.get(mask)
+    if packer is None:
+        formats = [f for bit, f in enumerate(FIELD_FORMATS) if mask & (1 << bit)]
+        packer = entity_structs[mask] = struct.Struct('<' + ''.join(formats))
+    return packer
+
+def next_free_id(id, used):
+    """the first id from id on that isn't in used, a rock can live long enough to still hold an id when it comes round."""
+    if len(used) > LAST_ID - FIRST_ID:
+        raise ValueError('no entity ids left')
+    while id in used:
+        id = id + 1 if id < LAST_ID else FIRST_ID
+    return id
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
+
+def quantize(kind, pos, vel, angle, angle_vel, frame):
+    return (kind, int(round(pos[0] * POS_SCALE)) % 65536, int(round(pos[1] * POS_SCALE)) % 65536,
+        clamp(int(round(vel[0] * VEL_SCALE)), -32768, 32767), clamp(int(round(vel[1] * VEL_SCALE)), -32768, 32767),
+        int(round((angle % 360) * ANGLE_SCALE)) % 65536, clamp(int(round(angle_vel * SPIN_SCALE)), -32768, 32767),
+        clamp(int(frame), 0, 255))
+
+def dequantize(record):
+    """(kind, pos, vel, angle, angle_vel, frame) for a record."""
+    kind, x, y, vx, vy, angle, angle_vel, frame = record
+    return (kind, [float(x) / POS_SCALE, float(y) / POS_SCALE], [float(vx) / VEL_SCALE, float(vy) / VEL_SCALE],
+        angle / ANGLE_SCALE, float(angle_vel) / SPIN_SCALE, frame)
+
+def predict(record, ticks, width, height):
+    # where a record will be ticks later if nothing acts on it, ships are
+    # slowed by friction so they are expected to stay put
+    kind, x, y, vx, vy, angle, angle_vel, frame = record
+    if kind == SHIP or ticks == 0:
+        return record
+    x = (x + vx * ticks * POS_SCALE // VEL_SCALE) % (width * POS_SCALE)
+    y = (y + vy * ticks * POS_SCALE // VEL_SCALE) % (height * POS_SCALE)
+    angle = (angle + angle_vel * ticks * 65536 // (360 * SPIN_SCALE)) % 65536
+    if kind == EXPLOSION:
+        frame = min(frame + ticks, 255)
+    return (kind, x, y, vx, vy, angle, angle_vel, frame)
+
+def close(a, b, tolerance, modulus = 65536):
+    d = abs(a - b) % modulus
+    return min(d, modulus - d) <= tolerance
+
+def get_checksum(table):
+    return zlib.crc32(repr(sorted(table.items()))) & 0xffffffff
+
+def predict_table(baseline, ticks, width, height):
+    return dict([(id, predict(record, ticks, width, height)) for id, record in baseline.iteritems()])
+
+def get_change_size(mask):
+    return ENTITY_HEADER.size + get_entity_struct(mask).size
+
+def encode_entities(table, predicted, width, height, size = MAX_STATE_SIZE):
+    """(removed ids, changes, what the client will have) for sending table to a client expecting predicted.
+
+    Whatever doesn't fit in a state of size bytes is left out, lowest ids
+    first so the ships always go, and the client's view keeps the old record.
+    """
+    view = {}
+    changes = []
+    moduli = (256, width * POS_SCALE, height * POS_SCALE, 65536, 65536, 65536, 65536, 256)
+    for id, record in table.iteritems():
+        old = predicted.get(id)
+        if old is None or old[0] != record[0]:
+            changes.append((id, ALL_FIELDS, record))
+            view[id] = record
+            continue
+        mask = 0
+        for field in range(1, 8):
+            tolerance = TOLERANCES[field]
+            if record[0] == SHIP:
+                tolerance = 0
+            if not close(record[field], old[field], tolerance, moduli[field]):
+                mask |= 1 << field
+        if mask:
+            merged = tuple([record[f] if mask & (1 << f) else old[f] for f in range(8)])
+            changes.append((id, mask, merged))
+            view[id] = merged
+        else:
+            view[id] = old
+    removed = [id for id in predicted if id not in table]
+
+    room = size - STATE_HEADER.size - 2 * len(removed)
+    if room < sum([get_change_size(mask) for id, mask, record in changes]):
+        # removals get at most a quarter of the room, the rest wait for a
+        # later tick with the client keeping what it predicted
+        for id in removed[(size - STATE_HEADER.size) // 8:]:
+            view[id] = predicted[id]
+        removed = removed[:(size - STATE_HEADER.size) // 8]
+        room = size - STATE_HEADER.size - 2 * len(removed)
+        changes.sort()
+        kept = []
+        for change in changes:
+            room -= get_change_size(change[1])
+            if room < 0:
+                break
+            kept.append(change)
+        for id, mask, record in changes[len(kept):]:
+            if id in predicted:
+                view[id] = predicted[id]
+            else:
+                del view[id]
+        changes = kept
+    return removed, changes, view
+
+def pack_state(header, removed, changes):
+    parts = [STATE_HEADER.pack(STATE, *(tuple(header) + (len(removed), len(changes))))]
+    parts.append(struct.pack('<%dH' % len(removed), *removed))
+    for id, mask, record in changes:
+        parts.append(ENTITY_HEADER.pack(id, mask))
+        parts.append(get_entity_struct(mask).pack(*[record[f] for f in range(8) if mask & (1 << f)]))
+    return ''.join(parts)
+
+def unpack_state(data, baseline, width, height):
+    """(header, table) from a state packet, baseline is the table of the tick it was sent against."""
+    header = STATE_HEADER.unpack_from(data, 0)
+    tick, base_tick, removed_count, changed_count = header[1], header[2], header[-2], header[-1]
+    offset = STATE_HEADER.size
+    table = {}
+    if base_tick:
+        table = predict_table(baseline, tick - base_tick, width, height)
+    for id in struct.unpack_from('<%dH' % removed_count, data, offset):
+        table.pop(id, None)
+    offset += removed_count * 2
+    for i in range(changed_count):
+        id, mask = ENTITY_HEADER.unpack_from(data, offset)
+        offset += ENTITY_HEADER.size
+        packer = get_entity_struct(mask)
+        values = iter(packer.unpack_from(data, offset))
+        offset += packer.size
+        old = table.get(id)
+        if old is None or mask & 1:
+            old = (0,) * 8
+        table[id] = tuple([next(values) if mask & (1 << f) else old[f] for f in range(8)])
+    return header[1:-2], table
+
+def pack_actions(actions):
+    parts = []
+    for name, value in actions:
+        if name == 'click':
+            parts.append(ACTION.pack(ACTIONS.index(name), value[0], value[1]))
+        else:
+            parts.append(ACTION.pack(ACTIONS.index(name), value, 0))
+    return ''.join(parts)
+
+def unpack_actions(data, offset, count):
+    actions = []
+    for i in range(count):
+        action, a, b = ACTION.unpack_from(data, offset)
+        offset += ACTION.size
+        if ACTIONS[action] == 'click':
+            actions.append(('click', (a, b)))
+        else:
+            actions.append((ACTIONS[action], a))
+    return actions, offset
+
+class NetServer:
+    """the host's end: takes the first client to send input as player two.
+
+    Each tick's entities are remembered as the client will have decoded
+    them, so the next tick can be sent as the difference from the newest
+    one the client acknowledged.
+    """
+
+    def __init__(self, port, width, height, history = 64):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('', port))
+        self.socket.setblocking(0)
+        self.width = width
+        self.height = height
+        self.history_size = history
+        self.client = None
+        self.last_input = 0
+        self.ack = 0
+        # tick -> (entities as the client has them, their checksum)
+        self.history = {}
+
+        self.sent = deque(maxlen = 3600)
+        self.received = deque(maxlen = 3600)
+        self.full = 0
+        self.deltas = 0
+        self.checked = 0
+        self.desyncs = 0
+
+    def get_port(self):
+        return self.socket.getsockname()[1]
+
+    def receive(self):
+        """the client's new actions, a list for each of its ticks."""
+        actions = []
+        while 1:
+            try:
+                data, address = self.socket.recvfrom(65536)
+            except socket.error:
+                break
+            if self.client is None:
+                self.client = address
+                print 'Player two joined from %s:%d' % address
+            if address != self.client or not data or ord(data[0]) != INPUT:
+                continue
+            self.received.append(len(data))
+
+            kind, newest, ack, checksum, count = INPUT_HEADER.unpack_from(data, 0)
+            offset = INPUT_HEADER.size
+            for i in range(count):
+                seq, length = INPUT_ENTRY.unpack_from(data, offset)
+                entry, offset = unpack_actions(data, offset + INPUT_ENTRY.size, length)
+                if seq > self.last_input:
+                    actions.append(entry)
+            self.last_input = max(self.last_input, newest)
+
+            if ack > self.ack and ack in self.history:
+                self.ack = ack
+                self.checked += 1
+                if self.history[ack][1] != checksum:
+                    self.desyncs += 1
+        return actions
+
+    def send(self, tick, wave, rocks_left, flags, winner, table):
+        if self.client is None:
+            return
+        base_tick = 0
+        predicted = {}
+        if self.ack in self.history:
+            base_tick = self.ack
+            predicted = predict_table(self.history[base_tick][0], tick - base_tick, self.width, self.height)
+        removed, changes, view = encode_entities(table, predicted, self.width, self.height)
+        data = pack_state((tick, base_tick, self.last_input, wave, rocks_left, flags, winner), removed, changes)
+        try:
+            self.socket.sendto(data, self.client)
+        except socket.error, message:
+            print 'Cannot send to player two:', message
+            return
+        self.sent.append(len(data))
+        if base_tick:
+            self.deltas += 1
+        else:
+            self.full += 1
+
+        self.history[tick] = (view, get_checksum(view))
+        old = tick - self.history_size
+        if old in self.history:
+            del self.history[old]
+
+    def report(self, ticks_per_second):
+        if self.client is None:
+            return "no player two"
+        sent = list(self.sent) or [0]
+        received = list(self.received) or [0]
+        average = float(sum(sent)) / len(sent)
+        return "sent %.0f bytes/tick (%.1f kbit/s, largest %d), %d full %d delta, received %.0f bytes/packet, %d/%d acks desynced" % (
+            average, average * ticks_per_second * 8 / 1000, max(sent), self.full, self.deltas,
+            float(sum(received)) / len(received), self.desyncs, self.checked)
+
+class NetClient:
+    """a player's end: sends input every tick and decodes the server's states.
+
+    Inputs the server hasn't applied yet are sent again with every packet
+    and kept for replaying on top of the server's view of our ship.
+    """
+
+    def __init__(self, address, width, height, history = 64):
+        self.address = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(0)
+        self.width = width
+        self.height = height
+        self.history_size = history
+        self.seq = 0
+        # (input number, actions, when it was sent) not yet applied by the server
+        self.pending = deque()
+        self.last_input = 0
+        self.tick = 0
+        self.history = {}
+
+        self.sent = deque(maxlen = 3600)
+        self.received = deque(maxlen = 3600)
+        self.latencies = deque(maxlen = 3600)
+        self.corrections = deque(maxlen = 3600)
+        self.stale = 0
+        self.undecodable = 0
+        # inputs with actions dropped before the server applied them
+        self.given_up = 0
+
+    def send_input(self, actions):
+        self.seq += 1
+        self.pending.append((self.seq, actions, timer()))
+        if len(self.pending) > MAX_PENDING:
+            # the server skips past it once a newer input arrives
+            if self.pending.popleft()[1]:
+                self.given_up += 1
+        entries = [(seq, acts) for seq, acts, sent in self.pending if acts]
+        checksum = 0
+        if self.tick in self.history:
+            checksum = self.history[self.tick][1]
+        parts = [INPUT_HEADER.pack(INPUT, self.seq, self.tick, checksum, len(entries))]
+        for seq, acts in entries:
+            parts.append(INPUT_ENTRY.pack(seq, len(acts)))
+            parts.append(pack_actions(acts))
+        data = ''.join(parts)
+        try:
+            self.socket.sendto(data, self.address)
+        except socket.error, message:
+            print 'Cannot send to the server:', message
+            return
+        self.sent.append(len(data))
+
+    def receive(self):
+        """the newest state sent, as (header, entities), or None if nothing new has come.
+
+        header is (tick, baseline tick, last input applied, wave, rocks left, flags, winner).
+        """
+        newest = None
+        while 1:
+            try:
+                data = self.socket.recv(65536)
+            except socket.error:
+                break
+            if not data or ord(data[0]) != STATE:
+                continue
+            self.received.append(len(data))
+            tick, base_tick = STATE_HEADER.unpack_from(data, 0)[1:3]
+            if tick <= self.tick:
+                self.stale += 1
+                continue
+            if base_tick and base_tick not in self.history:
+                self.undecodable += 1
+                continue
+            baseline = base_tick and self.history[base_tick][0]
+            header, table = unpack_state(data, baseline, self.width, self.height)
+            self.tick = tick
+            self.history[tick] = (table, get_checksum(table))
+            for old in [t for t in self.history if t <= tick - self.history_size]:
+                del self.history[old]
+
+            # input to the state that includes it
+            self.last_input = max(self.last_input, header[2])
+            now = timer()
+            while self.pending and self.pending[0][0] <= self.last_input:
+                seq, acts, sent = self.pending.popleft()
+                self.latencies.append(now - sent)
+            newest = (header, table)
+        return newest
+
+    def get_pending(self):
+        """the actions of each tick the server hasn't applied yet, oldest first."""
+        return [acts for seq, acts, sent in self.pending]
+
+    def add_correction(self, distance):
+        # how far the predicted ship was from where the server put it
+        self.corrections.append(distance)
+
+    def report(self, ticks_per_second):
+        received = list(self.received) or [0]
+        sent = list(self.sent) or [0]
+        average = float(sum(received)) / len(received)
+        return "received %.0f bytes/tick (%.1f kbit/s, largest %d), sent %.0f bytes/tick, input to state p50 %.1f ms p95 %.1f ms, prediction off by %.2f px on average, %d stale %d undecodable, %d inputs given up" % (
+            average, average * ticks_per_second * 8 / 1000, max(received), float(sum(sent)) / len(sent),
+            percentile(self.latencies, 0.5) * 1000, percentile(self.latencies, 0.95) * 1000,
+            sum(self.corrections) / max(1, len(self.corrections)), self.stale, self.undecodable, self.given_up)
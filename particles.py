@@ -0,0 +1,159 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+import pygame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class ParticleSystem:
+    """short lived dots for thrust trails and debris, held in numpy arrays.
+
+    capacity slots are allocated up front and handed out round robin, so
+    once they are all in use new particles take the place of the oldest.
+    Particles move and fade in one vectorized step and are drawn by
+    writing straight into the pixels of a 32 bit Surface. Anything else,
+    like the texture renderer, gets a blit of a small dot for each one.
+    They use their own random numbers so a recorded game plays the same.
+    """
+
+    def __init__(self, capacity, width, height, size = 2, drag = 0.97):
+        self.capacity = capacity
+        self.width = width
+        self.height = height
+        self.size = size
+        self.drag = drag
+        # x and y (and red, green and blue) are rows rather than columns so
+        # each one is contiguous, numpy is much quicker over those
+        self.pos = numpy.zeros((2, capacity), dtype=numpy.float32)
+        self.vel = numpy.zeros((2, capacity), dtype=numpy.float32)
+        # ticks left and the ticks there were to start with, for fading
+        self.life = numpy.zeros(capacity, dtype=numpy.float32)
+        self.max_life = numpy.ones(capacity, dtype=numpy.float32)
+        self.color = numpy.zeros((3, capacity), dtype=numpy.float32)
+        self.rng = numpy.random.RandomState(0)
+        # the next slot to hand out, and how many have ever been used
+        self.cursor = 0
+        self.used = 0
+        self.emitted = 0
+        self.recycled = 0
+        # dots for targets without pixel access, by colour
+        self.dots = {}
+
+    def emit(self, count, pos, vel, speed, life, color, direction = None, spread = 180):
+        """count particles at pos moving with vel plus up to speed in random directions.
+
+        direction and spread (in degrees either side) narrow the directions,
+        life is in ticks and colour varies a little from color.
+        """
+        count = min(int(count), self.capacity)
+        if count <= 0:
+            return
+        slots = (self.cursor + numpy.arange(count)) % self.capacity
+        self.cursor = (self.cursor + count) % self.capacity
+        self.used = min(self.capacity, self.used + count)
+        self.emitted += count
+        self.recycled += int((self.life[slots] > 0).sum())
+
+        rng = self.rng
+        if direction is None:
+            angles = rng.uniform(0, 2 * numpy.pi, count)
+        else:
+            angles = numpy.radians(direction + rng.uniform(-spread, spread, count))
+        speeds = rng.uniform(0.2, 1.0, count) * speed
+        self.pos[0, slots] = pos[0]
+        self.pos[1, slots] = pos[1]
+        self.vel[0, slots] = vel[0] + numpy.cos(angles) * speeds
+        # Y is down on screen
+        self.vel[1, slots] = vel[1] - numpy.sin(angles) * speeds
+        lives = rng.uniform(0.5, 1.0, count) * life
+        self.life[slots] = lives
+        self.max_life[slots] = lives
+        self.color[:, slots] = numpy.clip(numpy.array(color)[:, None] * rng.uniform(0.8, 1.2, count), 0, 255)
+
+    def step(self, ticks = 1.0):
+        # move, slow and age every slot ever used, dead ones are skipped when drawn
+        n = self.used
+        if n == 0:
+            return
+        self.pos[:, :n] += self.vel[:, :n] * ticks
+        self.vel[:, :n] *= self.drag ** ticks
+        # wrap around the edges, numpy.mod() is several times slower
+        for row, size in ((self.pos[0, :n], self.width), (self.pos[1, :n], self.height)):
+            numpy.subtract(row, size, out=row, where=row >= size)
+            numpy.add(row, size, out=row, where=row < 0)
+        self.life[:n] -= ticks
+
+    def get_live(self):
+        return numpy.flatnonzero(self.life[:self.used] > 0)
+
+    def draw(self, target, scale = 1):
+        """draw every live particle, returns the rect they were drawn in or None.
+
+        target is drawn on at 1/scale size.
+        """
+        live = self.get_live()
+        if len(live) == 0:
+            return None
+        # take() is a lot quicker than indexing with an array
+        fade = self.life.take(live) / self.max_life.take(live)
+        colors = (self.color.take(live, axis=1) * fade).astype(numpy.uint32)
+        x = (self.pos[0].take(live) / scale).astype(numpy.int32)
+        y = (self.pos[1].take(live) / scale).astype(numpy.int32)
+        size = max(1, self.size // scale)
+
+        if isinstance(target, pygame.Surface) and target.get_bytesize() == 4:
+            w, h = target.get_size()
+            x = numpy.minimum(x, w - size)
+            y = numpy.minimum(y, h - size)
+            # the same packing of red, green and blue as target.map_rgb()
+            shifts = target.get_shifts()
+            losses = target.get_losses()
+            mapped = numpy.zeros(len(live), dtype=numpy.uint32)
+            for channel in range(3):
+                mapped |= (colors[channel] >> losses[channel]) << shifts[channel]
+            pixels = pygame.surfarray.pixels2d(target)
+            for dx in range(size):
+                for dy in range(size):
+                    pixels[x + dx, y + dy] = mapped
+            # the Surface stays locked while the pixel array is around
+            del pixels
+        else:
+            # 64 colours are plenty for something this small and quick
+            keys = (colors.T >> 6).tolist()
+            target.blits([(self.get_dot(key), (left, top)) for key, left, top in zip(keys, x.tolist(), y.tolist())])
+
+        left, top = int(x.min()), int(y.min())
+        return pygame.Rect(left * scale, top * scale, (int(x.max()) - left + size) * scale, (int(y.max()) - top + size) * scale)
+
+    def get_dot(self, key):
+        key = tuple(key)
+        dot = self.dots.get(key)
+        if dot is None:
+            dot = self.dots[key] = pygame.Surface((self.size, self.size))
+            dot.fill([c * 64 + 32 for c in key])
+        return dot
+
+    def clear(self):
+        self.life[:] = 0
+
+    def report(self):
+        return "%d/%d live, %d emitted, %d recycled" % (len(self.get_live()), self.capacity, self.emitted, self.recycled)
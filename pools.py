@@ -0,0 +1,87 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+from collections import OrderedDict
+
+class Pool:
+    """a fixed number of sprites that are reused instead of being created and dropped.
+
+    acquire() hands out a free sprite reset with the given arguments and
+    release() takes it back. When none are free the policy decides:
+    'grow' creates another sprite, 'drop' returns None and 'recycle'
+    takes back the oldest sprite still in use.
+    """
+
+    policies = ('grow', 'drop', 'recycle')
+
+    def __init__(self, factory, capacity, policy = 'grow'):
+        if policy not in self.policies:
+            raise ValueError('unknown pool policy %s' % policy)
+        self.factory = factory
+        self.capacity = capacity
+        self.policy = policy
+
+        self.free = []
+        # the sprites handed out, oldest first
+        self.live = OrderedDict()
+
+        self.acquired = 0
+        self.released = 0
+        self.grown = 0
+        self.dropped = 0
+        self.recycled = 0
+
+        for i in range(capacity):
+            self.free.append(self.create())
+
+    def create(self):
+        sprite = self.factory()
+        sprite.pool = self
+        return sprite
+
+    def acquire(self, *args):
+        if not self.free:
+            if self.policy == 'drop':
+                self.dropped += 1
+                return None
+            elif self.policy == 'recycle' and self.live:
+                oldest = next(iter(self.live))
+                self.recycled += 1
+                # leaving its groups hands the sprite back through release()
+                oldest.kill()
+                self.release(oldest)
+            else:
+                self.grown += 1
+                self.free.append(self.create())
+
+        sprite = self.free.pop()
+        self.live[sprite] = True
+        self.acquired += 1
+        sprite.reset(*args)
+        return sprite
+
+    def release(self, sprite):
+        if sprite in self.live:
+            del self.live[sprite]
+            self.free.append(sprite)
+            self.released += 1
+
+    def report(self):
+        return "%d live, %d free, %d grown, %d dropped, %d recycled" % (
+            len(self.live), len(self.free), self.grown, self.dropped, self.recycled)
@@ -0,0 +1,248 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+import json
+from array import array
+from timeit import default_timer as timer
+
+import pygame
+
+def percentile(values, fraction):
+    # nearest rank, so a p95 means the same thing in every report
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+class FrameProfiler:
+    """per-phase frame timings kept in a fixed size ring buffer.
+
+    Call begin_frame() at the top of the frame, mark(phase) as each phase
+    finishes and end_frame() once the frame is done. A phase lasts from the
+    previous mark (or the start of the frame) to its own mark.
+
+    Given a counter, a function returning a running total of allocations,
+    each phase's allocations are kept alongside its time.
+    """
+
+    def __init__(self, phases, capacity):
+        self.phases = phases
+        self.phase_index = dict([(phase, i) for i, phase in enumerate(phases)])
+        self.capacity = capacity
+        self.enabled = False
+
+        n = len(phases)
+        self.durations = array('d', [0.0]) * (capacity * n)
+        self.frame_starts = array('d', [0.0]) * capacity
+        self.frame_times = array('d', [0.0]) * capacity
+        self.waves = array('i', [0]) * capacity
+        self.quality = array('i', [0]) * capacity
+        self.entities = array('i', [0]) * capacity
+        self.allocations = array('l', [0]) * (capacity * n)
+        self.frames = 0
+
+        # every mark on its own for the trace, in a ring with room for a few
+        # marks of each phase a frame; a frame's marks are numbered from first_marks
+        self.mark_capacity = capacity * n * 4
+        self.mark_phases = array('i', [0]) * self.mark_capacity
+        self.mark_starts = array('d', [0.0]) * self.mark_capacity
+        self.mark_durations = array('d', [0.0]) * self.mark_capacity
+        self.first_marks = array('l', [0]) * capacity
+        self.mark_counts = array('i', [0]) * capacity
+        self.marks = 0
+        self.frame_first_mark = 0
+
+        self.current_durations = [0.0] * n
+        self.current_allocations = [0] * n
+        self.frame_start = self.last = timer()
+        self.origin = self.frame_start
+        self.counter = None
+        self.last_count = 0
+
+    def begin_frame(self):
+        self.frame_start = self.last = timer()
+        self.frame_first_mark = self.marks
+        if self.counter:
+            self.last_count = self.counter()
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = timer()
+        i = self.phase_index[phase]
+        # a phase marked twice in a frame adds up, the trace keeps each mark
+        self.current_durations[i] += now - self.last
+        j = self.marks % self.mark_capacity
+        self.mark_phases[j] = i
+        self.mark_starts[j] = self.last
+        self.mark_durations[j] = now - self.last
+        self.marks += 1
+        self.last = now
+        if self.counter:
+            count = self.counter()
+            self.current_allocations[i] += count - self.last_count
+            self.last_count = count
+
+    def end_frame(self, wave, quality = 0, entities = 0):
+        if not self.enabled:
+            return
+        n = len(self.phases)
+        slot = self.frames % self.capacity
+        self.durations[slot * n:(slot + 1) * n] = array('d', self.current_durations)
+        self.allocations[slot * n:(slot + 1) * n] = array('l', self.current_allocations)
+        self.first_marks[slot] = self.frame_first_mark
+        self.mark_counts[slot] = self.marks - self.frame_first_mark
+        self.frame_starts[slot] = self.frame_start
+        self.frame_times[slot] = self.last - self.frame_start
+        self.waves[slot] = wave
+        self.quality[slot] = quality
+        self.entities[slot] = entities
+        self.frames += 1
+
+        self.current_durations = [0.0] * n
+        self.current_allocations = [0] * n
+
+    def get_slots(self, count = None):
+        # ring slots of the most recent frames, oldest first
+        available = min(self.frames, self.capacity)
+        if count is None or count > available:
+            count = available
+        first = self.frames - count
+        return [i % self.capacity for i in range(first, self.frames)]
+
+    def get_duration(self, slot, phase):
+        return self.durations[slot * len(self.phases) + self.phase_index[phase]]
+
+    def get_average_allocations(self, phase, count):
+        slots = self.get_slots(count)
+        if not slots:
+            return 0.0
+        i = self.phase_index[phase]
+        n = len(self.phases)
+        return sum([self.allocations[slot * n + i] for slot in slots]) / float(len(slots))
+
+    def get_busy_time(self, slot, idle = ('idle',)):
+        total = self.frame_times[slot]
+        for phase in idle:
+            total -= self.get_duration(slot, phase)
+        return total
+
+    def get_average(self, phase, count):
+        slots = self.get_slots(count)
+        if not slots:
+            return 0.0
+        return sum([self.get_duration(slot, phase) for slot in slots]) / len(slots)
+
+    def get_scaling(self):
+        """busy frame time against the number of entities on screen.
+
+        Frames are binned by entity count in powers of two, each bin gives
+        (fewest entities, frames, average busy time, 95th percentile).
+        """
+        bins = {}
+        for slot in self.get_slots():
+            entities = self.entities[slot]
+            low = 0
+            if entities > 0:
+                low = 1 << (entities.bit_length() - 1)
+            bins.setdefault(low, []).append(self.get_busy_time(slot))
+        scaling = []
+        for low in sorted(bins):
+            times = bins[low]
+            scaling.append((low, len(times), sum(times) / len(times), percentile(times, 0.95)))
+        return scaling
+
+    def get_trace(self):
+        """the recorded frames as Chrome trace events (chrome://tracing, Perfetto), one for each mark."""
+        events = []
+        # marks older than this have been written over
+        oldest = self.marks - self.mark_capacity
+        for slot in self.get_slots():
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1,
+                'ts': (self.frame_starts[slot] - self.origin) * 1000000,
+                'dur': self.frame_times[slot] * 1000000,
+                'args': {'wave': self.waves[slot], 'quality': self.quality[slot], 'entities': self.entities[slot]}})
+            first = self.first_marks[slot]
+            for k in range(max(first, oldest), first + self.mark_counts[slot]):
+                j = k % self.mark_capacity
+                duration = self.mark_durations[j]
+                if duration > 0:
+                    events.append({'name': self.phases[self.mark_phases[j]], 'ph': 'X', 'pid': 1, 'tid': 1,
+                        'ts': (self.mark_starts[j] - self.origin) * 1000000,
+                        'dur': duration * 1000000})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, filename):
+        f = open(filename, 'w')
+        json.dump(self.get_trace(), f)
+        f.close()
+
+phase_colors = [(128, 128, 128), (255, 255, 0), (0, 200, 255), (0, 128, 255), (255, 128, 0), (255, 64, 64),
+    (0, 255, 0), (200, 255, 200), (0, 160, 0), (255, 0, 255), (160, 160, 255), (255, 255, 255), (255, 200, 150), (0, 255, 200)]
+
+def draw_overlay(screen, profiler, font, budget, lines = (), text_cache = None):
+    """a frame time graph and per-phase bars in the top left corner of screen.
+
+    Text goes through text_cache when given, so the overlay doesn't make new
+    surfaces for strings it drew last frame.
+    """
+    def render(text, color):
+        if text_cache is None:
+            return font.render(text, 1, color)
+        return text_cache.render(font, text, 1, color)
+
+    graph_frames = 240
+    graph_height = 80
+    # the graph tops out at two frame budgets
+    scale = graph_height / (budget * 2)
+    texts = [render(line, (255, 255, 255)) for line in lines]
+    width = max([graph_frames + 20] + [text.get_width() + 20 for text in texts])
+    height = graph_height + 30 + 14 * (len(profiler.phases) + len(lines))
+
+    panel = pygame.Surface((width, height))
+    panel.set_alpha(200)
+    panel.fill((0, 0, 0))
+
+    x = 10 + graph_frames - len(profiler.get_slots(graph_frames))
+    for slot in profiler.get_slots(graph_frames):
+        busy = profiler.get_busy_time(slot)
+        h = min(graph_height, int(busy * scale))
+        if busy > budget:
+            color = (255, 64, 64)
+        else:
+            color = (0, 200, 0)
+        pygame.draw.line(panel, color, (x, 10 + graph_height), (x, 10 + graph_height - h))
+        x += 1
+    budget_y = 10 + graph_height - int(budget * scale)
+    pygame.draw.line(panel, (255, 255, 255), (10, budget_y), (10 + graph_frames, budget_y))
+
+    y = graph_height + 20
+    for i, phase in enumerate(profiler.phases):
+        average = profiler.get_average(phase, 60)
+        color = phase_colors[i % len(phase_colors)]
+        pygame.draw.rect(panel, color, (160, y + 3, min(graph_frames - 150, int(average * scale * 2)), 8))
+        panel.blit(render(phase, color), (10, y))
+        text = render('%.2f ms' % (average * 1000), color)
+        panel.blit(text, (150 - text.get_width(), y))
+        y += 14
+    for text in texts:
+        panel.blit(text, (10, y))
+        y += 14
+
+    return screen.blit(panel, (0, 0))
@@ -0,0 +1,96 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+import sys, struct
+from array import array
+
+MAGIC = 'YASSREC3'
+# magic, random seed, game mode, ticks, number of events
+HEADER = struct.Struct('<8sIBII')
+# tick, action, key or click x, click y
+EVENT = struct.Struct('<IBhh')
+
+ACTIONS = ('key_down', 'key_up', 'click')
+
+class Recording:
+    """the random seed, every input action and a state checksum for every tick of a game.
+
+    mode is a number standing for the kind of game played, which the
+    recording only keeps for whoever plays it back.
+    """
+
+    def __init__(self, seed, mode = 0):
+        self.seed = seed
+        self.mode = mode
+        self.ticks = 0
+        self.events = []
+        self.checksums = array('I')
+
+    def record(self, actions, checksum):
+        # call once per tick, after the tick has run
+        for name, value in actions:
+            if name == 'click':
+                self.events.append((self.ticks, ACTIONS.index(name), value[0], value[1]))
+            else:
+                self.events.append((self.ticks, ACTIONS.index(name), value, 0))
+        self.checksums.append(checksum)
+        self.ticks += 1
+
+    def get_actions(self):
+        """the list of actions for each tick."""
+        actions = [[] for tick in range(self.ticks)]
+        for tick, action, a, b in self.events:
+            name = ACTIONS[action]
+            if name == 'click':
+                actions[tick].append((name, (a, b)))
+            else:
+                actions[tick].append((name, a))
+        return actions
+
+    def save(self, filename):
+        checksums = array('I', self.checksums)
+        if sys.byteorder == 'big':
+            checksums.byteswap()
+        f = open(filename, 'wb')
+        f.write(HEADER.pack(MAGIC, self.seed, self.mode, self.ticks, len(self.events)))
+        for event in self.events:
+            f.write(EVENT.pack(*event))
+        f.write(checksums.tostring())
+        f.close()
+
+def load(filename):
+    f = open(filename, 'rb')
+    data = f.read()
+    f.close()
+
+    magic, seed, mode, ticks, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError('%s is not a YASS recording' % filename)
+    recording = Recording(seed, mode)
+    recording.ticks = ticks
+
+    offset = HEADER.size
+    for i in range(count):
+        recording.events.append(EVENT.unpack_from(data, offset))
+        offset += EVENT.size
+
+    recording.checksums.fromstring(data[offset:offset + ticks * recording.checksums.itemsize])
+    if sys.byteorder == 'big':
+        recording.checksums.byteswap()
+    return recording
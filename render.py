@@ -0,0 +1,129 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+import pygame
+
+class Renderer:
+    """presents frames either in full or by dirty rectangles.
+
+    In 'flip' mode every frame starts by blitting the whole background and
+    ends with pygame.display.flip(). In 'dirty' mode only the rectangles
+    drawn on the previous frame are restored from the background, and only
+    they and this frame's rectangles are sent to pygame.display.update().
+    """
+
+    def __init__(self, background, mode = 'flip'):
+        self.background = background
+        self.mode = mode
+        # rects to restore next frame, and everything to update this frame
+        self.previous = []
+        self.current = []
+        self.updates = []
+        self.full = True
+        self.static_key = None
+
+    def invalidate(self):
+        # repaint the whole screen on the next frame
+        self.full = True
+
+    def begin(self, screen, static_key = None):
+        """start a frame, returns False when there is nothing to draw.
+
+        static_key identifies a screen that does not change (the splash or
+        the game over screen), in dirty mode it is only drawn once.
+        """
+        if static_key != self.static_key:
+            self.static_key = static_key
+            self.full = True
+
+        if self.mode != 'dirty' or self.full:
+            screen.blit(self.background, (0, 0))
+            return True
+
+        if static_key is not None and not self.previous:
+            return False
+
+        for rect in self.previous:
+            screen.blit(self.background, rect, rect)
+        return True
+
+    def add(self, rects, static = False):
+        """record rectangles drawn this frame, static ones won't need restoring next frame."""
+        if self.mode != 'dirty' or rects is None:
+            return
+        if isinstance(rects, pygame.Rect):
+            rects = [rects]
+        if not static:
+            self.current.extend(rects)
+        self.updates.extend(rects)
+
+    def present(self):
+        if self.mode != 'dirty' or self.full:
+            pygame.display.flip()
+            self.full = False
+        else:
+            updates = self.previous + self.updates
+            if updates:
+                pygame.display.update(updates)
+        self.previous = self.current
+        self.current = []
+        self.updates = []
+
+class ScaledTarget:
+    """stands in for the screen and draws everything at 1/scale the size.
+
+    Blits go onto a smaller canvas with shrunk copies of the images, which
+    are kept for reuse. present() stretches the canvas back over the
+    screen. Rects handed back are in screen coordinates.
+    """
+
+    def __init__(self, screen, scale, capacity = 1024):
+        self.screen = screen
+        self.scale = scale
+        self.capacity = capacity
+        w, h = screen.get_size()
+        self.canvas = pygame.Surface((w // scale, h // scale), 0, screen)
+        self.images = {}
+
+    def shrink(self, image):
+        small = self.images.get(image)
+        if small is None:
+            if len(self.images) >= self.capacity:
+                self.images.clear()
+            w, h = image.get_size()
+            small = pygame.transform.scale(image, (max(1, w // self.scale), max(1, h // self.scale)))
+            self.images[image] = small
+        return small
+
+    def blit(self, image, dest, area = None):
+        s = self.scale
+        if area is not None:
+            area = pygame.Rect(area[0] // s, area[1] // s, area[2] // s + 1, area[3] // s + 1)
+        rect = self.canvas.blit(self.shrink(image), (int(dest[0]) // s, int(dest[1]) // s), area)
+        return pygame.Rect(rect.x * s, rect.y * s, rect.w * s, rect.h * s)
+
+    def blits(self, sequence):
+        return [self.blit(image, dest) for image, dest in sequence]
+
+    def get_size(self):
+        return self.screen.get_size()
+
+    def present(self):
+        pygame.transform.scale(self.canvas, self.screen.get_size(), self.screen)
+        return self.screen.get_rect()
@@ -0,0 +1,197 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+import pygame
+
+from collision import mask_from_surface
+
+def mask_memory(masks):
+    # a mask holds a bit per pixel
+    total = 0
+    for mask in masks:
+        w, h = mask.get_size()
+        total += w * h / 8
+    return total
+
+class RotationCache:
+    """pre-rotated copies of a Surface, one per angle bucket.
+
+    Collision masks of the rotated copies are kept too. Their buckets are
+    fixed when the cache is made, so turning the drawn buckets down with
+    set_buckets() doesn't change where things collide. They are made from
+    mask_surface when given, the image as it was loaded, so they don't
+    depend on the display's pixel format.
+    """
+
+    def __init__(self, surface, buckets, prebuild = False, mask_surface = None):
+        self.surface = surface
+        self.mask_surface = mask_surface or surface
+        self.set_buckets(buckets)
+        self.mask_buckets = self.buckets
+        self.masks = [None] * self.mask_buckets
+        if prebuild:
+            self.build()
+
+    def set_buckets(self, buckets):
+        self.buckets = max(1, int(buckets))
+        self.bucket_size = 360.0 / self.buckets
+        self.surfaces = [None] * self.buckets
+        self.hits = 0
+        self.misses = 0
+
+    def get_bucket(self, angle):
+        return int(round((angle % 360) / self.bucket_size)) % self.buckets
+
+    def get_bucket_angle(self, bucket):
+        return bucket * self.bucket_size
+
+    def rotate(self, bucket):
+        return pygame.transform.rotate(self.surface, self.get_bucket_angle(bucket))
+
+    def get_buckets(self, angles):
+        # get_bucket() for a numpy array of angles, as a list
+        return (((angles % 360) / self.bucket_size + 0.5).astype(int) % self.buckets).tolist()
+
+    def get(self, angle):
+        return self.get_bucket_surface(self.get_bucket(angle))
+
+    def get_bucket_surface(self, bucket):
+        surface = self.surfaces[bucket]
+        if surface is None:
+            self.misses += 1
+            surface = self.surfaces[bucket] = self.rotate(bucket)
+        else:
+            self.hits += 1
+        return surface
+
+    def build(self):
+        for bucket in range(self.buckets):
+            if self.surfaces[bucket] is None:
+                self.surfaces[bucket] = self.rotate(bucket)
+
+    def get_mask(self, angle):
+        bucket = int(round((angle % 360) / (360.0 / self.mask_buckets))) % self.mask_buckets
+        mask = self.masks[bucket]
+        if mask is None:
+            if self.mask_surface is self.surface and self.buckets == self.mask_buckets:
+                surface = self.surfaces[bucket]
+                if surface is None:
+                    surface = self.surfaces[bucket] = self.rotate(bucket)
+            else:
+                surface = pygame.transform.rotate(self.mask_surface, bucket * 360.0 / self.mask_buckets)
+            mask = self.masks[bucket] = mask_from_surface(surface)
+        return mask
+
+    def get_memory(self):
+        # bytes of pixel data held by the cached surfaces
+        total = 0
+        for surface in self.surfaces:
+            if surface is not None:
+                total += surface.get_pitch() * surface.get_height()
+        return total
+
+    def get_hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return float(self.hits) / lookups
+
+    def report(self):
+        built = len([s for s in self.surfaces if s is not None])
+        masks = [mask for mask in self.masks if mask is not None]
+        return "%d/%d buckets built, %.1f KB, hit rate %.1f%%, %d/%d masks, %.1f KB" % (built, self.buckets,
+            self.get_memory() / 1024.0, self.get_hit_rate() * 100, len(masks), self.mask_buckets, mask_memory(masks) / 1024.0)
+
+class FrameRotationTable:
+    """every frame of an animation strip rotated into every angle bucket.
+
+    Lookups return the rotated surface and the offset from the sprite's
+    center to the surface's top left corner, ready to blit. Each is made
+    the first time it is asked for, unless prebuild is set, so a backend
+    that turns sprites as it draws them never pays for the table.
+    Collision masks are made from mask_surface when given, as RotationCache
+    does.
+    """
+
+    def __init__(self, surface, frame_size, frames, buckets, mask_surface = None, prebuild = False):
+        self.surface = surface
+        self.mask_surface = mask_surface
+        self.frame_size = frame_size
+        self.frames = frames
+        self.buckets = max(1, int(buckets))
+        self.bucket_size = 360.0 / self.buckets
+        self.table = {}
+        self.masks = {}
+        self.hits = 0
+        self.misses = 0
+        if prebuild:
+            self.build()
+
+    def get_bucket(self, angle):
+        return int(round((angle % 360) / self.bucket_size)) % self.buckets
+
+    def rotate(self, frame, bucket):
+        source = self.surface.subsurface((frame * self.frame_size[0], 0), self.frame_size)
+        rotated = pygame.transform.rotate(source, bucket * self.bucket_size)
+        w, h = rotated.get_size()
+        return (rotated, (-(w / 2), -(h / 2)))
+
+    def get(self, frame, angle):
+        key = (frame, self.get_bucket(angle))
+        entry = self.table.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = self.table[key] = self.rotate(*key)
+        else:
+            self.hits += 1
+        return entry
+
+    def build(self):
+        for frame in range(self.frames):
+            for bucket in range(self.buckets):
+                if (frame, bucket) not in self.table:
+                    self.table[(frame, bucket)] = self.rotate(frame, bucket)
+
+    def get_mask(self, frame, angle):
+        key = (frame, self.get_bucket(angle))
+        mask = self.masks.get(key)
+        if mask is None:
+            if self.mask_surface is None:
+                surface = self.rotate(*key)[0]
+            else:
+                source = self.mask_surface.subsurface((frame * self.frame_size[0], 0), self.frame_size)
+                surface = pygame.transform.rotate(source, key[1] * self.bucket_size)
+            mask = self.masks[key] = mask_from_surface(surface)
+        return mask
+
+    def get_memory(self):
+        total = 0
+        for surface, offset in self.table.values():
+            total += surface.get_pitch() * surface.get_height()
+        return total
+
+    def get_hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return float(self.hits) / lookups
+
+    def report(self):
+        return "%d/%d surfaces built, %.1f KB, hit rate %.1f%%, %d masks, %.1f KB" % (len(self.table), self.frames * self.buckets,
+            self.get_memory() / 1024.0, self.get_hit_rate() * 100, len(self.masks), mask_memory(self.masks.values()) / 1024.0)
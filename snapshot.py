@@ -0,0 +1,175 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+
+import sys, struct
+from array import array
+from collections import deque
+
+MAGIC = 'YASSSNP2'
+# magic, time, wave, wave_rocks_left, lives, playing, dead, betweenwaves, wavedelaystarttime, next_wave_time, mode
+HEADER = struct.Struct('<8sIiiiBBBIIB')
+# present, pos, prev_pos, vel, angle, angle_vel, thrust
+SHIP = struct.Struct('<B8dB')
+# random module state version, whether there is a gauss_next, gauss_next, then the Mersenne Twister words
+RANDOM = struct.Struct('<iBdI')
+# sprites, slots used, free slots
+GROUP = struct.Struct('<III')
+
+def pack(header, ship, random_state, groups):
+    """the game state as a string of bytes.
+
+    header holds HEADER's values after the magic, ship SHIP's after
+    present or None when there is no ship, random_state is from
+    random.getstate() and groups are EntityGroup.get_state() results.
+    Numbers are packed into typed arrays, no objects are pickled.
+    """
+    parts = [HEADER.pack(MAGIC, *header)]
+    if ship is None:
+        parts.append(SHIP.pack(0, *([0.0] * 8 + [0])))
+    else:
+        parts.append(SHIP.pack(1, *ship))
+
+    version, words, gauss_next = random_state
+    words = array('I', words)
+    if sys.byteorder == 'big':
+        words.byteswap()
+    parts.append(RANDOM.pack(version, gauss_next is not None, gauss_next or 0.0, len(words)))
+    parts.append(words.tostring())
+
+    for slots, used, free, values in groups:
+        parts.append(GROUP.pack(len(slots) / 4, used, len(free) / 4))
+        parts += [slots, free, values]
+    return ''.join(parts)
+
+def unpack(data, group_values):
+    """the reverse of pack(), group_values is the number of doubles saved for each sprite."""
+    header = HEADER.unpack_from(data, 0)
+    if header[0] != MAGIC:
+        raise ValueError('not a YASS snapshot')
+    offset = HEADER.size
+
+    ship = SHIP.unpack_from(data, offset)
+    offset += SHIP.size
+    if ship[0]:
+        ship = ship[1:]
+    else:
+        ship = None
+
+    version, has_gauss, gauss_next, count = RANDOM.unpack_from(data, offset)
+    offset += RANDOM.size
+    words = array('I')
+    words.fromstring(data[offset:offset + count * 4])
+    if sys.byteorder == 'big':
+        words.byteswap()
+    offset += count * 4
+    if not has_gauss:
+        gauss_next = None
+    random_state = (version, tuple(words), gauss_next)
+
+    groups = []
+    while offset < len(data):
+        sprites, used, free = GROUP.unpack_from(data, offset)
+        offset += GROUP.size
+        slots = data[offset:offset + sprites * 4]
+        offset += sprites * 4
+        free_slots = data[offset:offset + free * 4]
+        offset += free * 4
+        values = data[offset:offset + sprites * group_values * 8]
+        offset += sprites * group_values * 8
+        groups.append((slots, used, free_slots, values))
+    return header[1:], ship, random_state, groups
+
+def save(filename, data):
+    f = open(filename, 'wb')
+    f.write(data)
+    f.close()
+
+def load(filename):
+    f = open(filename, 'rb')
+    data = f.read()
+    f.close()
+    if not data.startswith(MAGIC):
+        raise ValueError('%s is not a YASS snapshot' % filename)
+    return data
+
+class RewindBuffer:
+    """the most recent snapshots, kept in a fixed amount of memory.
+
+    Snapshots are copied one after another into a single bytearray that
+    is allocated once. When the next one doesn't fit in the space left the
+    writing starts again from the front, and the oldest snapshots in the
+    way are forgotten.
+    """
+
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.size = size
+        # (tick, start, length), oldest first
+        self.entries = deque()
+        self.head = 0
+        self.used = 0
+        self.pushed = 0
+        self.dropped = 0
+        self.longest = 0
+
+    def push(self, tick, data):
+        length = len(data)
+        if length > self.size:
+            self.dropped += 1
+            return
+        if self.head + length > self.size:
+            # whatever is left at the back is the oldest, start again at the front
+            while self.entries and self.entries[0][1] >= self.head:
+                self.forget()
+            self.head = 0
+        end = self.head + length
+        while self.entries and self.head <= self.entries[0][1] < end:
+            self.forget()
+        self.buffer[self.head:end] = data
+        self.entries.append((tick, self.head, length))
+        self.head = end
+        self.used += length
+        self.pushed += 1
+        self.longest = max(self.longest, length)
+
+    def forget(self):
+        tick, start, length = self.entries.popleft()
+        self.used -= length
+
+    def pop(self):
+        """the most recent snapshot, which is removed, or None when there are none left."""
+        if not self.entries:
+            return None
+        tick, start, length = self.entries.pop()
+        self.used -= length
+        self.head = start
+        return str(self.buffer[start:start + length])
+
+    def clear(self):
+        self.entries.clear()
+        self.head = 0
+        self.used = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def report(self, ticks_per_second):
+        return "%d snapshots, %.1f s, %.0f KB used of %.0f KB, largest %.1f KB" % (len(self.entries),
+            float(len(self.entries)) / ticks_per_second, self.used / 1024.0, self.size / 1024.0, self.longest / 1024.0)
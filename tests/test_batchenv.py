@@ -0,0 +1,117 @@
+# batchenv.py keeps its own copy of the game rules. These tests put the
+# same ships, rocks and input into both it and main.step() and check the
+# two games stay together tick by tick.
+#
+#   python -m unittest discover tests
+
+import os, sys, unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy
+from pygame.locals import K_LEFT, K_RIGHT, K_UP, K_SPACE
+import main
+import batchenv
+from batchenv import TURN, THRUST, FIRE
+
+# (pos, vel) of each rock, placed clear of the ship
+ROCKS = [((400, 120), (0.5, 1.0)), ((100, 500), (1.5, -0.5)), ((700, 450), (-1.0, -1.2)), ((60, 60), (0.25, 0.75))]
+
+def script(ticks):
+    """a fixed run of (turn, thrust, fire) actions that turns, thrusts and shoots."""
+    actions = []
+    for tick in range(ticks):
+        turn = (0, 1, 0, -1)[(tick // 25) % 4]
+        thrust = int(40 <= tick % 100 < 70)
+        fire = int(tick % 6 == 0)
+        actions.append((turn, thrust, fire))
+    return actions
+
+def to_events(previous, action):
+    """the key presses main.step() needs to play action after previous."""
+    events = []
+    keys = {1: K_LEFT, -1: K_RIGHT}
+    if previous[TURN] != action[TURN]:
+        if previous[TURN]:
+            events.append(('key_up', keys[previous[TURN]]))
+        if action[TURN]:
+            events.append(('key_down', keys[action[TURN]]))
+    if previous[THRUST] != action[THRUST]:
+        events.append((('key_up', 'key_down')[action[THRUST]], K_UP))
+    if action[FIRE]:
+        events.append(('key_down', K_SPACE))
+    return events
+
+class ParityTest(unittest.TestCase):
+
+    def setUp(self):
+        main.init_headless()
+        self.old = (main.g.mode, main.g.mask_collisions)
+        # batchenv tests circles only and has no stress mode
+        main.g.mode = 'normal'
+        main.g.mask_collisions = False
+        main.new_game()
+
+    def tearDown(self):
+        main.g.mode, main.g.mask_collisions = self.old
+        main.stop_game()
+
+    def place(self, env, rocks):
+        # the same rocks in both, and no more to come until they are gone
+        for i, (pos, vel) in enumerate(rocks):
+            main.rock_group.add(main.Sprite(pos, vel, 0, 1, main.asteroid_image, main.asteroid_info, None, main.asteroid_rotations))
+            env.rock_pos[0, i] = pos
+            env.rock_vel[0, i] = vel
+            env.rock_alive[0, i] = True
+        main.g.wave_rocks_left = len(rocks)
+        env.wave_rocks_left[0] = len(rocks)
+        main.g.time = 1
+        env.time[0] = 1
+
+    def compare(self, env, tick):
+        ship = main.my_ship
+        where = 'at tick %d' % tick
+        self.assertEqual(main.g.playing, bool(env.playing[0]), where)
+        self.assertEqual(main.g.wave_rocks_left, env.wave_rocks_left[0], where)
+        if not main.g.playing:
+            return
+        numpy.testing.assert_allclose(ship.pos, env.ship_pos[0], atol=1e-6, err_msg=where)
+        numpy.testing.assert_allclose(ship.vel, env.ship_vel[0], atol=1e-6, err_msg=where)
+        self.assertAlmostEqual(ship.angle, env.ship_angle[0], 6, where)
+        for group, pos, alive in ((main.rock_group, env.rock_pos, env.rock_alive), (main.missile_group, env.missile_pos, env.missile_alive)):
+            ours = sorted([tuple(s.get_position()) for s in group])
+            theirs = sorted([tuple(p) for p in pos[0][alive[0]].tolist()])
+            self.assertEqual(len(ours), len(theirs), where)
+            numpy.testing.assert_allclose(numpy.array(ours).reshape(-1, 2), numpy.array(theirs).reshape(-1, 2), atol=1e-6, err_msg=where)
+
+    def run_both(self, rocks, actions):
+        # left finished, so the death shows the same way in both
+        env = batchenv.BatchEnv(1, seed=1, auto_reset=False)
+        self.place(env, rocks)
+        previous = (0, 0, 0)
+        for tick, action in enumerate(actions):
+            main.step(to_events(previous, action))
+            env.step(numpy.array([action]))
+            previous = action
+            self.compare(env, tick)
+            if not main.g.playing:
+                break
+        return env
+
+    def test_flying_and_shooting(self):
+        # the far rocks outlive the script, so neither game starts a new wave
+        self.run_both(ROCKS, script(300))
+        self.assertTrue(main.g.wave_rocks_left < len(ROCKS))
+
+    def test_ship_destroyed(self):
+        ship = main.my_ship.get_position()
+        env = self.run_both([((ship[0] + 150, ship[1]), (-2, 0))], [(0, 0, 0)] * 120)
+        self.assertFalse(main.g.playing)
+        self.assertFalse(env.playing[0])
+
+if __name__ == '__main__':
+    unittest.main()
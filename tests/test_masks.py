@@ -0,0 +1,80 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+# Collision masks must not depend on how the display converted the images,
+# or a game recorded in a window could replay differently headless.
+#
+#   python -m unittest discover tests
+
+import os, sys, unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+import main
+from collision import MaskTester
+
+def get_bits(mask):
+    w, h = mask.get_size()
+    return (w, h, tuple([mask.get_at((x, y)) for y in range(h) for x in range(w)]))
+
+def load_masks():
+    """every collision mask the game uses, loaded afresh for the current display."""
+    main.mask_tester = MaskTester()
+    main.load_game_assets()
+    masks = {'missile': get_bits(main.mask_tester.get_image_mask(main.missile_image))}
+    rotations = main.asteroid_rotations
+    for bucket in range(rotations.mask_buckets):
+        masks[('rock', bucket)] = get_bits(rotations.get_mask(bucket * 360.0 / rotations.mask_buckets))
+    table = main.ship_rotations
+    for bucket in range(0, table.buckets, 7):
+        masks[('ship', bucket)] = get_bits(table.get_mask(0, bucket * table.bucket_size))
+    return masks
+
+class MaskTest(unittest.TestCase):
+
+    def tearDown(self):
+        pygame.display.quit()
+
+    def test_same_with_and_without_a_display(self):
+        pygame.display.quit()
+        headless = load_masks()
+        for depth in (32, 16):
+            pygame.display.init()
+            pygame.display.set_mode((100, 100), 0, depth)
+            windowed = load_masks()
+            pygame.display.quit()
+            self.assertEqual(sorted(headless), sorted(windowed))
+            for key in headless:
+                self.assertEqual(headless[key], windowed[key], '%s differs at depth %d' % (key, depth))
+
+    def test_transparent_pixels_are_left_out(self):
+        pygame.display.quit()
+        masks = load_masks()
+        w, h, bits = masks['missile']
+        self.assertTrue(0 < sum(bits) < w * h)
+        w, h, bits = masks[('rock', 0)]
+        self.assertTrue(0 < sum(bits) < w * h * 0.8)
+
+if __name__ == '__main__':
+    unittest.main()
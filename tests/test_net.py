@@ -0,0 +1,154 @@
+# The state codec in net.py: what the server thinks the client has must be
+# exactly what the client decodes, through deltas, removals, entity ids
+# going round and states too big for one packet.
+#
+#   python -m unittest discover tests
+
+import os, sys, random, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import net
+
+WIDTH, HEIGHT = 800, 600
+
+def make_record(rng, kind):
+    return net.quantize(kind, (rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT)), (rng.uniform(-3, 3), rng.uniform(-3, 3)),
+        rng.uniform(0, 360), rng.uniform(-2, 2), rng.randint(0, 20))
+
+def step_table(rng, table, ticks):
+    # what the game does between two states: things move, some go, some come
+    table = net.predict_table(table, ticks, WIDTH, HEIGHT)
+    for id in list(table):
+        if id > 2 and rng.random() < 0.1:
+            del table[id]
+        elif rng.random() < 0.3:
+            kind, x, y, vx, vy, angle, angle_vel, frame = table[id]
+            table[id] = (kind, (x + rng.randint(-200, 200)) % (WIDTH * net.POS_SCALE), y, vx, vy + rng.randint(-50, 50),
+                angle, angle_vel, frame)
+    for i in range(rng.randint(0, 5)):
+        table[rng.randint(net.FIRST_ID, 1000)] = make_record(rng, rng.choice((net.ROCK, net.MISSILE, net.EXPLOSION)))
+    return table
+
+def send(table, tick, baseline, base_tick, size = net.MAX_STATE_SIZE):
+    """the packet for table against baseline, and the view the server keeps."""
+    predicted = {}
+    if base_tick:
+        predicted = net.predict_table(baseline, tick - base_tick, WIDTH, HEIGHT)
+    removed, changes, view = net.encode_entities(table, predicted, WIDTH, HEIGHT, size)
+    data = net.pack_state((tick, base_tick, 0, 1, 5, net.PLAYING, 0), removed, changes)
+    return data, view
+
+class CodecTest(unittest.TestCase):
+
+    def test_quantize_round_trip(self):
+        kind, pos, vel, angle, angle_vel, frame = net.dequantize(net.quantize(net.ROCK, (123.4, 567.8), (-1.5, 2.25), 370.0, -0.5, 7))
+        self.assertEqual(kind, net.ROCK)
+        self.assertAlmostEqual(pos[0], 123.4, 0)
+        self.assertAlmostEqual(pos[1], 567.8, 0)
+        self.assertEqual(vel, [-1.5, 2.25])
+        self.assertAlmostEqual(angle, 10.0, 2)
+        self.assertEqual((angle_vel, frame), (-0.5, 7))
+
+    def test_full_state(self):
+        rng = random.Random(1)
+        table = dict([(id, make_record(rng, net.ROCK)) for id in range(net.FIRST_ID, 50)])
+        table[1] = make_record(rng, net.SHIP)
+        data, view = send(table, 10, None, 0)
+        header, decoded = net.unpack_state(data, None, WIDTH, HEIGHT)
+        self.assertEqual(header, (10, 0, 0, 1, 5, net.PLAYING, 0))
+        self.assertEqual(decoded, table)
+        self.assertEqual(view, table)
+
+    def test_deltas_match_the_server_view(self):
+        rng = random.Random(2)
+        table = dict([(id, make_record(rng, net.ROCK)) for id in range(net.FIRST_ID, 40)])
+        table[1] = make_record(rng, net.SHIP)
+        data, server = send(table, 1, None, 0)
+        client = net.unpack_state(data, None, WIDTH, HEIGHT)[1]
+        base_tick = 1
+        for tick in range(2, 200):
+            table = step_table(rng, table, 1)
+            # the client's acks come back a few ticks late
+            data, view = send(table, tick, server, base_tick)
+            decoded = net.unpack_state(data, client, WIDTH, HEIGHT)[1]
+            self.assertEqual(net.get_checksum(decoded), net.get_checksum(view), 'tick %d' % tick)
+            self.assertEqual(decoded[1], table[1])
+            for id, record in table.iteritems():
+                self.assertTrue(id in decoded)
+                self.assertEqual(decoded[id][0], record[0])
+            if tick % 3 == 0:
+                server, client, base_tick = view, decoded, tick
+
+    def test_kind_change_sends_everything(self):
+        rng = random.Random(3)
+        table = {5: make_record(rng, net.ROCK)}
+        data, server = send(table, 1, None, 0)
+        client = net.unpack_state(data, None, WIDTH, HEIGHT)[1]
+        table = {5: make_record(rng, net.MISSILE)}
+        data, view = send(table, 2, server, 1)
+        self.assertEqual(net.unpack_state(data, client, WIDTH, HEIGHT)[1], table)
+
+    def test_too_big_for_one_packet(self):
+        rng = random.Random(4)
+        table = dict([(id, make_record(rng, net.ROCK)) for id in range(net.FIRST_ID, 5000)])
+        table[1] = make_record(rng, net.SHIP)
+        server, client, base_tick = {}, {}, 0
+        for tick in range(1, 40):
+            data, view = send(table, tick, server, base_tick, 4096)
+            self.assertTrue(len(data) <= 4096)
+            client = net.unpack_state(data, client if base_tick else None, WIDTH, HEIGHT)[1]
+            self.assertTrue(client == view)
+            self.assertEqual(client[1], table[1])
+            server, base_tick = view, tick
+            if len(client) == len(table):
+                break
+            table = net.predict_table(table, 1, WIDTH, HEIGHT)
+        # each tick carries what it can, the rest follow
+        self.assertTrue(client == table)
+
+        # and all of them going at once
+        data, view = send({1: table[1]}, tick + 1, server, base_tick, 4096)
+        self.assertTrue(len(data) <= 4096)
+        client = net.unpack_state(data, client, WIDTH, HEIGHT)[1]
+        self.assertTrue(client == view)
+        self.assertTrue(1 in client)
+        self.assertTrue(1 < len(client) < len(table))
+
+    def test_actions_round_trip(self):
+        actions = [('key_down', 275), ('key_up', 32), ('click', (400, 300))]
+        data = net.pack_actions(actions)
+        self.assertEqual(net.unpack_actions(data, 0, len(actions)), (actions, len(data)))
+
+class IdTest(unittest.TestCase):
+
+    def test_ids_skip_those_in_use(self):
+        used = set([net.FIRST_ID, net.FIRST_ID + 1, net.LAST_ID])
+        self.assertEqual(net.next_free_id(net.FIRST_ID, used), net.FIRST_ID + 2)
+        self.assertEqual(net.next_free_id(net.LAST_ID, used), net.FIRST_ID + 2)
+        self.assertEqual(net.next_free_id(net.LAST_ID - 1, set()), net.LAST_ID - 1)
+
+    def test_running_out(self):
+        used = set(range(net.FIRST_ID, net.LAST_ID + 1))
+        self.assertRaises(ValueError, net.next_free_id, net.FIRST_ID, used)
+
+class ClientTest(unittest.TestCase):
+
+    def setUp(self):
+        # nothing listens on the server's end, sent packets are just lost
+        self.client = net.NetClient(('127.0.0.1', 9), WIDTH, HEIGHT)
+
+    def tearDown(self):
+        self.client.socket.close()
+
+    def test_inputs_are_resent_until_applied(self):
+        for i in range(net.MAX_PENDING + 10):
+            self.client.send_input([('key_down', 32)])
+        self.assertEqual(len(self.client.get_pending()), net.MAX_PENDING)
+        self.assertEqual(self.client.given_up, 10)
+        # every pending input goes in each packet, the count is a byte
+        self.assertEqual(self.client.sent[-1], net.INPUT_HEADER.size + net.MAX_PENDING * (net.INPUT_ENTRY.size + net.ACTION.size))
+
+if __name__ == '__main__':
+    unittest.main()
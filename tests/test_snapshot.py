@@ -0,0 +1,111 @@
+# Snapshots and the rewind buffer: a restored game has to carry on exactly
+# as the original did, and the buffer has to hand back every snapshot it
+# still holds intact however the writing has wrapped round.
+#
+#   python -m unittest discover tests
+
+import os, sys, random, tempfile, unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main
+import snapshot
+from snapshot import RewindBuffer
+
+def play(actions):
+    """step through actions, the checksum after each tick."""
+    checksums = []
+    for tick in actions:
+        main.step(tick)
+        checksums.append(main.state_checksum())
+    return checksums
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        main.init_headless()
+        self.mode = main.g.mode
+        random.seed(5)
+
+    def tearDown(self):
+        main.g.mode = self.mode
+        main.stop_game()
+
+    def take_and_replay(self):
+        pilot = main.autopilot(True)
+        for tick in range(150):
+            main.step(next(pilot))
+        data = main.take_snapshot()
+        actions = [next(pilot) for tick in range(200)]
+        expected = play(actions)
+
+        main.restore_snapshot(data)
+        self.assertEqual(main.take_snapshot(), data)
+        self.assertEqual(play(actions), expected)
+        return data
+
+    def test_restored_game_plays_the_same(self):
+        main.g.mode = 'normal'
+        self.take_and_replay()
+
+    def test_stress_mode(self):
+        main.g.mode = 'stress'
+        data = self.take_and_replay()
+        main.g.mode = 'normal'
+        main.restore_snapshot(data)
+        self.assertEqual(main.g.mode, 'stress')
+
+    def test_save_and_load(self):
+        pilot = main.autopilot()
+        for tick in range(100):
+            main.step(next(pilot))
+        data = main.take_snapshot()
+        handle, filename = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            snapshot.save(filename, data)
+            self.assertEqual(snapshot.load(filename), data)
+            snapshot.save(filename, 'not a snapshot')
+            self.assertRaises(ValueError, snapshot.load, filename)
+        finally:
+            os.remove(filename)
+
+class RewindBufferTest(unittest.TestCase):
+
+    def test_wraps_round_and_keeps_the_newest(self):
+        rng = random.Random(1)
+        buffer = RewindBuffer(1000)
+        # what the buffer should hold, oldest first
+        held = []
+        for tick in range(2000):
+            if held and rng.random() < 0.2:
+                self.assertEqual(buffer.pop(), held.pop()[1])
+                continue
+            data = chr(tick % 256) * rng.randint(1, 300)
+            buffer.push(tick, data)
+            held.append((tick, data))
+            # whatever was forgotten, what is left is the newest and fits
+            held = held[-len(buffer):]
+            self.assertTrue(buffer.used <= buffer.size)
+            self.assertEqual(buffer.used, sum([len(d) for t, d in held]))
+            self.assertEqual([t for t, start, length in buffer.entries], [t for t, d in held])
+        while held:
+            self.assertEqual(buffer.pop(), held.pop()[1])
+        self.assertEqual(buffer.pop(), None)
+
+    def test_too_big_to_keep(self):
+        buffer = RewindBuffer(100)
+        buffer.push(1, 'a' * 60)
+        buffer.push(2, 'b' * 101)
+        self.assertEqual(buffer.dropped, 1)
+        self.assertEqual(len(buffer), 1)
+        buffer.push(3, 'c' * 60)
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(buffer.pop(), 'c' * 60)
+
+if __name__ == '__main__':
+    unittest.main()
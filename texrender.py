@@ -0,0 +1,98 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+from collections import OrderedDict
+
+import pygame
+# needs pygame 2, main.py falls back to the Surface renderer without it
+from pygame._sdl2.video import Window, Renderer, Texture
+
+class TextureRenderer:
+    """draws through SDL's 2D renderer instead of blitting Surfaces.
+
+    Images are uploaded as textures the first time they are drawn and the
+    renderer turns and blends them as it draws, so rotating sprites need
+    no pre-rotated copies. It stands in for both the screen and
+    render.Renderer in main.draw(). accelerated=0 asks SDL for its software
+    renderer, for machines without a GPU.
+    """
+
+    def __init__(self, background, accelerated = -1, capacity = 256):
+        self.window = Window.from_display_module()
+        self.renderer = Renderer(self.window, accelerated=accelerated)
+        self.background = background
+        self.size = background.get_size()
+        self.capacity = capacity
+        self.textures = OrderedDict()
+        self.uploads = 0
+        self.draws = 0
+
+    def get_texture(self, image):
+        # least recently drawn textures go first, HUD text keeps changing
+        texture = self.textures.pop(image, None)
+        if texture is None:
+            if len(self.textures) >= self.capacity:
+                self.textures.popitem(False)
+            texture = Texture.from_surface(self.renderer, image)
+            self.uploads += 1
+        self.textures[image] = texture
+        return texture
+
+    # what main.draw() uses of render.Renderer
+    def invalidate(self):
+        pass
+
+    def begin(self, screen, static_key = None):
+        self.get_texture(self.background).draw()
+        return True
+
+    def add(self, rects, static = False):
+        pass
+
+    def present(self):
+        self.renderer.present()
+
+    # and of the screen Surface
+    def get_size(self):
+        return self.size
+
+    def blit(self, image, dest, area = None):
+        if area is None:
+            w, h = image.get_size()
+        else:
+            area = pygame.Rect(area)
+            w, h = area.size
+        rect = pygame.Rect(int(dest[0]), int(dest[1]), w, h)
+        self.get_texture(image).draw(area, rect)
+        self.draws += 1
+        return rect
+
+    def blits(self, sequence):
+        return [self.blit(image, dest) for image, dest in sequence]
+
+    def draw_rotated(self, image, center, angle):
+        rect = pygame.Rect((0, 0), image.get_size())
+        rect.center = (int(center[0]), int(center[1]))
+        # SDL turns clockwise, pygame.transform.rotate anticlockwise
+        self.get_texture(image).draw(None, rect, -angle)
+        self.draws += 1
+        return rect
+
+    def report(self):
+        return "%d/%d textures, %d uploads, %d draws" % (len(self.textures), self.capacity, self.uploads, self.draws)
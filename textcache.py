@@ -0,0 +1,67 @@
+# This file is part of "Yet Another Space Shooter" (YASS)
+#
+# YASS is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YASS is distributed in the hope that it will be useful and maybe even fun,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YASS.  If not, see <http://www.gnu.org/licenses/>.
+#
+# copyright  2012 onwards Andrew Davis
+# license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+#
+
+from collections import OrderedDict
+
+import pygame
+
+# pygame.font.SysFont searches the system's fonts every time it is called
+fonts = {}
+
+def get_font(name, size):
+    key = (name, size)
+    if key not in fonts:
+        fonts[key] = pygame.font.SysFont(name, size)
+    return fonts[key]
+
+class TextCache:
+    """rendered text surfaces, least recently used ones are dropped first."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color, background = None):
+        key = (font, text, antialias, color, background)
+        surface = self.surfaces.pop(key, None)
+        if surface is None:
+            self.misses += 1
+            if background is None:
+                surface = font.render(text, antialias, color)
+            else:
+                surface = font.render(text, antialias, color, background)
+            if len(self.surfaces) >= self.capacity:
+                self.surfaces.popitem(last=False)
+        else:
+            self.hits += 1
+        # reinserting moves the surface to the most recently used end
+        self.surfaces[key] = surface
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = 0.0
+        if lookups:
+            rate = 100.0 * self.hits / lookups
+        return "%d/%d surfaces, hit rate %.1f%%" % (len(self.surfaces), self.capacity, rate)